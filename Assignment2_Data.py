@@ -1,7 +1,38 @@
+import csv  # streaming import and export of records
+import functools
+import gc
+import heapq  # heap operations for the triage queue
+import json  # serialization of the persistence journal
+import mmap  # zero-copy access to patient archives
+import os
 import random  # To assign random values
+import re  # tokenizing text for the full-text index
+import struct  # fixed-width binary rows of patient archives
+import sys
+import threading  # locks of the thread-safe record system, queues and ID allocators
 import time  # to calculate the efficiency of each algorithm
-from collections import defaultdict
+import types
+import weakref  # change listeners that do not keep their objects alive
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict, deque
+from datetime import datetime
 from enum import Enum
+from itertools import islice
+from operator import attrgetter, itemgetter
+
+_numpy = []  # the numpy module (or None when it is not installed), imported on first use
+
+
+def _load_numpy():
+    # NumPy is optional and slow to import, so it is only imported when the columnar store needs it
+    if not _numpy:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _numpy.append(numpy)
+    return _numpy[0]
 
 class RandomNames(Enum):
     AHMED = "Ahmed"
@@ -27,97 +58,298 @@ class RandomMedicalHistory(Enum):
     ENTRY_9 = "Patient has a history of depression and anxiety."
     ENTRY_10 = "Patient underwent knee replacement surgery recently."
 
+class TriageLevel(Enum):
+    CRITICAL = 1
+    URGENT = 2
+    STANDARD = 3
+    NON_URGENT = 4
+
+
+def patient_id_key(patient_id):
+    """Return the sort key of a patient ID, ordering HP2 before HP10 (prefix, then number)."""
+    prefix = patient_id.rstrip("0123456789")
+    digits = patient_id[len(prefix):]
+    return (prefix, int(digits) if digits else -1)
+
+
+# Functions called with (patient_id, field) whenever a patient's details change; bound methods are held
+# through a weakref.WeakMethod, which drops out of the list once its object is garbage collected
+_patient_listeners = []
+
+
+def add_patient_listener(listener):
+    """
+    Call listener(patient_id, field) after every change to a patient, its appointments, prescriptions or record.
+    A bound method does not keep its object alive: an unused SummaryCache or FullTextIndex stops listening
+    when it is collected, even if close() was never called.
+    """
+    if isinstance(listener, types.MethodType):
+        listener = weakref.WeakMethod(listener, _drop_patient_listener)
+    _patient_listeners.append(listener)
+
+
+def _drop_patient_listener(reference):
+    # Called when the object of a weakly held listener is collected
+    if reference in _patient_listeners:
+        _patient_listeners.remove(reference)
+
+
+def remove_patient_listener(listener):
+    for entry in _patient_listeners:
+        if (entry() if isinstance(entry, weakref.WeakMethod) else entry) == listener:
+            _patient_listeners.remove(entry)
+            return
+
+
+def _patient_changed(patient_id, field):
+    # Callers check _patient_listeners first, so changes cost nothing extra while nobody listens
+    for entry in list(_patient_listeners):
+        listener = entry() if isinstance(entry, weakref.WeakMethod) else entry
+        if listener is not None:
+            listener(patient_id, field)
+
+
+class IdAllocator:
+    """
+    Thread-safe source of the IDs of one entity type, e.g. HP1, HP2, ... for patients.
+    Every ID is handed out once, even when several threads create entities at the same time.
+    """
+
+    # Constructor
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._last = 0  # number of the last ID handed out or observed
+        self._lock = threading.Lock()
+
+    def get_last(self):
+        return self._last
+
+    def next_id(self):
+        """Return a new, unique ID."""
+        with self._lock:
+            self._last += 1
+            return f"{self.prefix}{self._last}"
+
+    def reserve(self, k):
+        """Reserve k consecutive IDs in one step and return the number of the first one."""
+        with self._lock:
+            first = self._last + 1
+            self._last += k
+            return first
+
+    def observe(self, identifier):
+        """Note an existing ID (e.g. a restored record), so that new IDs never collide with it."""
+        prefix, number = patient_id_key(identifier)
+        if prefix == self.prefix:
+            with self._lock:
+                if number > self._last:
+                    self._last = number
+
+
+class IdCount:
+    """
+    Read-only class attribute with the number of the last ID of the class's id_allocator,
+    kept so the old counters (Patient.patient_count, Doctor.doctor_count, ...) still read correctly.
+    """
+
+    def __get__(self, instance, owner):
+        return owner.id_allocator.get_last()
+
+    def __set__(self, instance, value):
+        raise AttributeError("ID counters are read-only, IDs come from id_allocator")
+
+
+def date_key(value):
+    """Return a date string such as '2024-4-1' as the integer 20240401, or -1 if it cannot be parsed."""
+    try:
+        year, month, day = (int(part) for part in value.split('-'))
+    except (AttributeError, ValueError):
+        return -1
+    return year * 10000 + month * 100 + day
+
+
+def format_date_key(key):
+    """Return an integer date such as 20240401 as '2024-04-01', the inverse of date_key, or None for -1."""
+    if key < 0:
+        return None
+    return f"{key // 10000:04d}-{key // 100 % 100:02d}-{key % 100:02d}"
+
+
+def normalize_date(value):
+    """Return a date string such as '2024-4-1' as '2024-04-01', unparsable values are returned unchanged."""
+    key = date_key(value)
+    if key < 0:
+        return value
+    return format_date_key(key)
+
+
+def appointment_minutes(date, time_of_day):
+    """Return a date ('2024-4-5') and time ('10:30') as minutes since 0001-01-01, or None if they cannot be parsed."""
+    key = date_key(date)
+    try:
+        hours, minutes = (int(part) for part in time_of_day.split(':'))
+        day = datetime(key // 10000, key // 100 % 100, key % 100).toordinal()
+    except (AttributeError, ValueError):
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return day * 1440 + hours * 60 + minutes
+
+
+def format_appointment_minutes(value):
+    """Return minutes since 0001-01-01 as a (date, time) pair of strings, the inverse of appointment_minutes."""
+    day = datetime.fromordinal(value // 1440)
+    return day.strftime("%Y-%m-%d"), f"{value % 1440 // 60:02d}:{value % 60:02d}"
+
 
 class Patient:
     """Class that represent the patients"""
-    patient_count = 0
+    __slots__ = ('_patient_id', '_name', '_date_of_birth', '_medical_history', '_phone', '_admission_date',
+                 '_appointments', '_prescriptions', '_record')
+    id_allocator = IdAllocator("HP")
+    patient_count = IdCount()  # Number of the last ID handed out
+    DATE_FIELDS = ('date_of_birth', 'admission_date')  # 'YYYY-M-D' strings, ordered by date_key
 
     # Constructor
-    def __init__(self, name, date_of_birth, medical_history, phone, admission_date):
-        Patient.patient_count += 1
-        self._patient_id = f"HP{Patient.patient_count}"  # Generate patient ID automatically
+    def __init__(self, name, date_of_birth, medical_history, phone, admission_date, patient_id=None):
+        if patient_id is None:
+            self._patient_id = Patient.id_allocator.next_id()  # Generate patient ID automatically
+        else:
+            # Restoring an existing patient, make sure generated IDs never collide with it
+            self._patient_id = patient_id
+            Patient.id_allocator.observe(patient_id)
         self._name = name  # patient's name
         self._date_of_birth = date_of_birth  # patient's date of birth
         self._medical_history = medical_history  # patient's medical history
         self._phone = phone
         self._admission_date = admission_date
-        self._appointments = []  # list to store appointments
-        self._prescriptions = Stack()
+        self._appointments = None  # list to store appointments, created on first use
+        self._prescriptions = None  # stack of prescriptions, created on first use
         self._record = None
 
     # Setters and Getters
     def get_patient_id(self):
         return self._patient_id
 
+    def set_name(self, value):
+        self._name = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'name')
+
     def get_name(self):
         return self._name
 
+    def set_date_of_birth(self, value):
+        self._date_of_birth = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'date_of_birth')
+
     def get_date_of_birth(self):
         return self._date_of_birth
 
     def set_medical_history(self, value):
         self._medical_history = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'medical_history')
 
     def get_medical_history(self):
         return self._medical_history
 
     def set_phone(self, value):
         self._phone = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'phone')
 
     def get_phone(self):
         return self._phone
 
     def set_admission_date(self, value):
         self._admission_date = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'admission_date')
 
     def get_admission_date(self):
         return self._admission_date
 
     def get_appointments(self):
+        if self._appointments is None:
+            self._appointments = []
         return self._appointments
 
     def get_prescriptions(self):
+        if self._prescriptions is None:
+            self._prescriptions = Stack()
         return self._prescriptions
 
     def remove_appointment(self, appointment):
-        self._appointments.remove(appointment)
+        self.get_appointments().remove(appointment)
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'appointments')
 
     def add_prescription(self, prescription):
-        self._prescriptions.push(prescription)
+        self.get_prescriptions().push(prescription)
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'prescriptions')
 
     def fulfill_prescription(self):
-        if not self._prescriptions.is_empty():
-            return self._prescriptions.pop()
+        if self._prescriptions is not None and not self._prescriptions.is_empty():
+            prescription = self._prescriptions.pop()
+            if _patient_listeners:
+                _patient_changed(self._patient_id, 'prescriptions')
+            return prescription
         else:
             print("No prescriptions to fulfill.")
             return None
 
+    def get_record(self):
+        return self._record
+
     def add_record(self, record):
         self._record = record  # Assume 'record' is an instance of the 'Record' class
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'record')
 
     @staticmethod
-    def quicksort_records(records, low, high, sort_key):
-        """Sorts the patient records using the quicksort algorithm based on the given sort_key."""
-        if low < high:
-            # Partition the list
-            pi = Patient.partition(records, low, high, sort_key)
-            # Sort the partitions
-            Patient.quicksort_records(records, low, pi - 1, sort_key)
-            Patient.quicksort_records(records, pi + 1, high, sort_key)
+    def sort_key_function(sort_key):
+        """
+        Return a function that extracts the sort key of one record.
+        sort_key is a field name such as 'Patient_id' or 'admission_date', or a tuple of
+        field names for a compound key, e.g. ('Admission_date', 'Name').
+        """
+        if isinstance(sort_key, (tuple, list)):
+            key_functions = [Patient.sort_key_function(field) for field in sort_key]
+            return lambda record: tuple(key_function(record) for key_function in key_functions)
+
+        field = sort_key.lower().lstrip('_')
+        getter = getattr(Patient, f'get_{field}')  # Resolve the getter once, not per comparison
+        if field == 'patient_id':
+            return lambda record: patient_id_key(getter(record))
+        if field in Patient.DATE_FIELDS:
+            # Dates such as '2021-9-9' are not zero-padded, so they are compared as integers, not strings
+            return lambda record: date_key(getter(record))
+        return getter
+
+    @staticmethod
+    def sort_records(records, sort_key, low=0, high=None):
+        """
+        Sort records[low..high] in place based on the given sort_key.
+        Each record's key is extracted once, then the records are ordered by a stable,
+        non-recursive merge sort (Timsort), so sorted and reverse-sorted input stay O(n log n).
+        """
+        if high is None:
+            high = len(records) - 1
+        if low >= high:
+            return
+        key_function = Patient.sort_key_function(sort_key)
+        if low == 0 and high == len(records) - 1:
+            records.sort(key=key_function)
+        else:
+            records[low:high + 1] = sorted(records[low:high + 1], key=key_function)
 
     @staticmethod
-    def partition(records, low, high, sort_key):
-        """Helper function for quicksort_records to partition the sublist."""
-        # Pivot (Element to be placed at the right position)
-        pivot = getattr(records[high], f'get{sort_key}')()  # Use the getter method
-        i = low - 1
-        for j in range(low, high):
-            if getattr(records[j], f'get{sort_key}')() <= pivot:  # Use the getter method
-                # Increment index of smaller element
-                i = i + 1
-                records[i], records[j] = records[j], records[i]
-        records[i + 1], records[high] = records[high], records[i + 1]
-        return i + 1
+    def quicksort_records(records, low, high, sort_key):
+        """Sorts the patient records between low and high based on the given sort_key (see sort_records)."""
+        Patient.sort_records(records, sort_key, low, high)
 
     @staticmethod
     def search_patient(patient_records, patient_id):
@@ -125,63 +357,152 @@ class Patient:
 
     def update_details(self, name=None, date_of_birth=None, medical_history=None):
         if name is not None:
-            self._name = name  # update name if provided
+            self.set_name(name)  # update name if provided
         if date_of_birth is not None:
-            self._date_of_birth = date_of_birth  # update date of birth if provided
+            self.set_date_of_birth(date_of_birth)  # update date of birth if provided
         if medical_history is not None:
-            self._medical_history = medical_history  # update medical history if provided
+            self.set_medical_history(medical_history)  # update medical history if provided
 
     def add_appointment(self, appointment):
         # Ensure that the appointment is for this patient
         if appointment._patient == self:
-            self._appointments.append(appointment)
+            self.get_appointments().append(appointment)
+            if _patient_listeners:
+                _patient_changed(self._patient_id, 'appointments')
         else:
             print("This appointment is not for this patient.")
 
-    def print_patient_summary(self):
+    def get_summary(self):
+        """Return the patient's details, appointments, prescriptions and record as a dictionary."""
+        summary = {'patient_id': self._patient_id, 'name': self._name, 'date_of_birth': self._date_of_birth,
+                   'medical_history': self._medical_history, 'phone': self._phone,
+                   'admission_date': self._admission_date, 'appointments': [], 'prescriptions': [], 'record': None}
+        for appointment in self._appointments or ():
+            doctor = appointment.get_doctor()
+            summary['appointments'].append({'date': appointment.get_date(), 'time': appointment.get_time(),
+                                            'doctor': doctor.get_name() if isinstance(doctor, Doctor) else doctor})
+        if self._prescriptions is not None:
+            for prescription in self._prescriptions.get_items():
+                summary['prescriptions'].append({'medication': prescription.get_medication(),
+                                                 'dosage': prescription.get_dosage(),
+                                                 'duration': prescription.get_duration()})
+        if self._record:
+            summary['record'] = {'diagnosis': self._record.get_diagnosis(),
+                                 'treatment_plan': self._record.get_treatment_plan()}
+        return summary
+
+    def render_summary(self):
+        """Return the text printed by print_patient_summary."""
+        summary = self.get_summary()
+        lines = [f"Patient ID: {summary['patient_id']}", f"Name: {summary['name']}",
+                 f"Date of Birth: {summary['date_of_birth']}", f"Medical History: {summary['medical_history']}",
+                 f"Phone: {summary['phone']}", f"Admission Date: {summary['admission_date']}"]
+        if summary['appointments']:
+            lines.append("Appointments:")
+            lines += [f"- {appointment['date']} at {appointment['time']} with {appointment['doctor']}"
+                      for appointment in summary['appointments']]
+        if summary['prescriptions']:
+            lines.append("Prescriptions:")
+            lines += [f"- Medication: {prescription['medication']}, Dosage: {prescription['dosage']}, "
+                      f"Duration: {prescription['duration']}" for prescription in summary['prescriptions']]
+        if summary['record']:
+            lines += ["Medical Record:", f"- Diagnosis: {summary['record']['diagnosis']}",
+                      f"- Treatment Plan: {summary['record']['treatment_plan']}"]
+        return "\n".join(lines)
+
+    def print_patient_summary(self, cache=None):
         """
         Print a summary of the patient's details, appointments, prescriptions, and records.
+        With a SummaryCache, the text is only rendered again after the patient has changed.
         """
-        print(f"Patient ID: {self._patient_id}")
-        print(f"Name: {self._name}")
-        print(f"Date of Birth: {self._date_of_birth}")
-        print(f"Medical History: {self._medical_history}")
-        print(f"Phone: {self._phone}")
-        print(f"Admission Date: {self._admission_date}")
-
-        # Print appointments
-        if self._appointments:
-            print("Appointments:")
-            for appointment in self._appointments:
-                print(
-                    f"- {appointment.get_date()} at {appointment.get_time()} with {appointment.get_doctor().get_name()}")
-
-        # Print prescriptions
-        if not self._prescriptions.is_empty():
-            print("Prescriptions:")
-            for prescription in self._prescriptions.get_items():
-                print(
-                    f"- Medication: {prescription.get_medication()}, Dosage: {prescription.get_dosage()}, Duration: {prescription.get_duration()}")
+        print(cache.get(self, 'text', Patient.render_summary) if cache is not None else self.render_summary())
 
-        # Print record
-        if self._record:
-            print("Medical Record:")
-            print(f"- Diagnosis: {self._record.get_diagnosis()}")
-            print(f"- Treatment Plan: {self._record.get_treatment_plan()}")
+
+class AppointmentScheduler:
+    """
+    Sorted interval index of one doctor's appointments, in minutes (see appointment_minutes).
+    Booked intervals never overlap, so sorting by start also sorts by end and every
+    conflict check is two binary searches.
+    """
+
+    # Constructor
+    def __init__(self):
+        self._starts = []  # sorted start minutes
+        self._ends = []  # end minutes, parallel to _starts
+        self._appointments = []  # appointments, parallel to _starts
+
+    def __len__(self):
+        return len(self._starts)
+
+    def find_conflict(self, start, end):
+        """Return the booked appointment overlapping [start, end), or None, in O(log n)."""
+        index = bisect_right(self._starts, start)
+        if index > 0 and self._ends[index - 1] > start:
+            return self._appointments[index - 1]
+        if index < len(self._starts) and self._starts[index] < end:
+            return self._appointments[index]
+        return None
+
+    def add(self, appointment):
+        """Book the appointment, returns False without booking it if it overlaps another one."""
+        start, end = appointment.get_start(), appointment.get_end()
+        if self.find_conflict(start, end) is not None:
+            return False
+        index = bisect_right(self._starts, start)
+        self._starts.insert(index, start)
+        self._ends.insert(index, end)
+        self._appointments.insert(index, appointment)
+        return True
+
+    def remove(self, appointment):
+        start = appointment.get_start()
+        index = bisect_left(self._starts, start)
+        # Look through every booking with the same start, not only the first one
+        while index < len(self._starts) and self._starts[index] == start:
+            if self._appointments[index] is appointment:
+                del self._starts[index]
+                del self._ends[index]
+                del self._appointments[index]
+                return
+            index += 1
+
+    def in_window(self, start, end):
+        """Return the appointments overlapping [start, end), in time order."""
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._starts, end)
+        return self._appointments[first:last]
+
+    def next_free_slot(self, after, length):
+        """Return the earliest start at or after `after` with `length` free minutes."""
+        candidate = after
+        index = bisect_right(self._ends, after)
+        # Only the block of back-to-back appointments right after `after` is walked
+        while index < len(self._starts) and self._starts[index] < candidate + length:
+            candidate = max(candidate, self._ends[index])
+            index += 1
+        return candidate
 
 
 class Doctor:
     """Class that represents doctors"""
-    doctor_count = 0
+    __slots__ = ('_doctor_id', '_name', '_specialty', '_appointments', '_patients', '_patient_appointments',
+                 '_scheduler')
+    id_allocator = IdAllocator("HD")
+    doctor_count = IdCount()  # Number of the last ID handed out
 
     # Constructor
-    def __init__(self, name, specialty):
-        Doctor.doctor_count += 1
-        self._doctor_id = f"HD{Patient.patient_count}"  # Generate patient ID automatically
+    def __init__(self, name, specialty, doctor_id=None):
+        if doctor_id is None:
+            self._doctor_id = Doctor.id_allocator.next_id()  # Generate doctor ID automatically
+        else:
+            self._doctor_id = doctor_id
+            Doctor.id_allocator.observe(doctor_id)
         self._name = name
         self._specialty = specialty
-        self._appointments = []  # List of Appointment objects
-        self._patients = []      # List of Patient objects
+        self._appointments = {}  # Maps appointment_id to Appointment, in scheduling order
+        self._patients = {}      # Roster mapping patient_id to Patient, for O(1) membership checks
+        self._patient_appointments = {}  # Maps patient_id to {appointment_id: Appointment}
+        self._scheduler = AppointmentScheduler()  # Booked time intervals, for conflict checks
 
 
 
@@ -199,89 +520,822 @@ class Doctor:
         return self._specialty
 
     def set_appointments(self, value):
-        self._appointments = value
+        self._appointments = {}
+        self._patient_appointments = {}
+        self._scheduler = AppointmentScheduler()
+        for appointment in value:
+            self._index_appointment(appointment)
+            if appointment.get_start() is not None:
+                self._scheduler.add(appointment)
 
     def get_appointments(self):
-        return self._appointments
+        return list(self._appointments.values())
+
+    def get_patients(self):
+        return list(self._patients.values())
+
+    def has_patient(self, patient_id):
+        return patient_id in self._patients
 
     def remove_appointment(self, appointment):
-        self._appointments.remove(appointment)
+        # Removes the appointment from both indexes in O(1)
+        appointment_id = appointment.get_appointment_id()
+        if self._appointments.pop(appointment_id, None) is None:
+            raise ValueError(f"Appointment {appointment_id} is not scheduled with this doctor")
+        if appointment.get_start() is not None:
+            self._scheduler.remove(appointment)
+        patient_id = appointment.get_patient_id()
+        by_patient = self._patient_appointments.get(patient_id)
+        if by_patient is not None:
+            by_patient.pop(appointment_id, None)
+            if not by_patient:
+                del self._patient_appointments[patient_id]
 
 
     def add_patient(self, patient):
-        # Adds a new patient to the doctor's list, if not already present
-        if patient not in self._patients:
-            self._patients.append(patient)
+        # Adds a new patient to the doctor's roster, if not already present
+        patient_id = patient.get_patient_id() if isinstance(patient, Patient) else patient
+        if patient_id not in self._patients:
+            self._patients[patient_id] = patient
 
     def remove_patient(self, patient):
-        # Removes a patient from the doctor's list, if present
-        if patient in self._patients:
-            self._patients.remove(patient)
+        # Removes a patient from the doctor's roster, if present
+        patient_id = patient.get_patient_id() if isinstance(patient, Patient) else patient
+        self._patients.pop(patient_id, None)
+
+    def _index_appointment(self, appointment):
+        self._appointments[appointment.get_appointment_id()] = appointment
+        self._patient_appointments.setdefault(appointment.get_patient_id(), {})[
+            appointment.get_appointment_id()] = appointment
 
     def schedule_appointment(self, appointment):
         # Schedules a new appointment, ensuring the patient is assigned to the doctor
-        if appointment._patient not in self._patients:
-            self.add_patient(appointment._patient)
-        self._appointments.append(appointment)
+        # Returns False without scheduling it if it overlaps another appointment of this doctor
+        if appointment.get_start() is not None and not self._scheduler.add(appointment):
+            print(f"Appointment {appointment.get_appointment_id()} overlaps another appointment of {self._name}.")
+            return False
+        self.add_patient(appointment.get_patient())
+        self._index_appointment(appointment)
+        return True
+
+    def is_available(self, date, time_of_day, duration=30):
+        # Checks the slot against the booked appointments in O(log n)
+        start = appointment_minutes(date, time_of_day)
+        if start is None:
+            return True  # free-form times cannot be checked
+        return self._scheduler.find_conflict(start, start + duration) is None
+
+    def next_free_slot(self, date, time_of_day, duration=30):
+        # Returns the (date, time) of the first free slot of the given length at or after the given time
+        start = appointment_minutes(date, time_of_day)
+        if start is None:
+            return None
+        return format_appointment_minutes(self._scheduler.next_free_slot(start, duration))
+
+    def get_appointments_in_window(self, start_date, start_time, end_date, end_time):
+        # Returns the appointments overlapping the window, in time order
+        start = appointment_minutes(start_date, start_time)
+        end = appointment_minutes(end_date, end_time)
+        if start is None or end is None:
+            return []
+        return self._scheduler.in_window(start, end)
 
     def get_patient_appointments(self, patient_id):
-        # Returns appointments for a specific patient
-        return [appointment for appointment in self._appointments if appointment._patient.get_patient_id() == patient_id]
+        # Returns appointments for a specific patient in O(k), k being that patient's appointments
+        return list(self._patient_appointments.get(patient_id, {}).values())
+
+    def is_scheduled(self, appointment):
+        return self._appointments.get(appointment.get_appointment_id()) is appointment
+
+    def reschedule_appointment(self, appointment, date, time_of_day):
+        # Moves a scheduled appointment to a new date and time, keeping the booked intervals in sync
+        # Returns False, leaving the appointment where it was, if the new slot overlaps another appointment
+        if not self.is_scheduled(appointment):
+            raise ValueError(f"Appointment {appointment.get_appointment_id()} is not scheduled with this doctor")
+        if appointment.get_start() is not None:
+            self._scheduler.remove(appointment)  # so it cannot conflict with itself
+        start = appointment_minutes(date, time_of_day)
+        if start is not None and self._scheduler.find_conflict(start, start + appointment.get_duration()) is not None:
+            if appointment.get_start() is not None:
+                self._scheduler.add(appointment)
+            print(f"Appointment {appointment.get_appointment_id()} overlaps another appointment of {self._name}.")
+            return False
+        appointment._set_slot(date, time_of_day)
+        if start is not None:
+            self._scheduler.add(appointment)
+        return True
 
 
 
     # Class variable for holding doctors
     doctors = {}
+    _doctors_lock = threading.Lock()
 
     # Class method to add a doctor to the doctors dictionary
     @classmethod
     def add_doctor(cls, doctor_id, name, specialty):
-        if doctor_id not in cls.doctors:
-            cls.doctors[doctor_id] = Doctor(doctor_id, name, specialty)
-        else:
-            print(f"Doctor with ID {doctor_id} already exists.")
+        with cls._doctors_lock:  # check and insert in one step, so two threads cannot both add the same ID
+            if doctor_id not in cls.doctors:
+                cls.doctors[doctor_id] = Doctor(name, specialty, doctor_id=doctor_id)
+                return cls.doctors[doctor_id]
+        print(f"Doctor with ID {doctor_id} already exists.")
+        return None
+
+
+class SummaryCache:
+    """
+    Bounded LRU cache of rendered patient summaries, keyed by patient ID.
+    A patient's entry holds one summary per kind (e.g. 'text' or 'dict') and is dropped as soon as the
+    patient, their appointments, prescriptions or record change. Cached dictionaries must not be modified.
+    """
+
+    # Constructor
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # maps patient_id to {kind: summary}, least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        add_patient_listener(self.invalidate)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, patient, kind, render):
+        """Return the cached summary of that kind for the patient, rendering it with render(patient) on a miss."""
+        patient_id = patient.get_patient_id()
+        entry = self._entries.get(patient_id)
+        if entry is not None:
+            self._entries.move_to_end(patient_id)
+            summary = entry.get(kind)
+            if summary is not None:
+                self.hits += 1
+                return summary
+        self.misses += 1
+        summary = render(patient)
+        if entry is None:
+            entry = self._entries[patient_id] = {}
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        entry[kind] = summary
+        return summary
+
+    def get_text(self, patient):
+        return self.get(patient, 'text', Patient.render_summary)
+
+    def get_dict(self, patient):
+        return self.get(patient, 'dict', Patient.get_summary)
+
+    def invalidate(self, patient_id, field=None):
+        """Drop the cached summaries of a patient; called on every change to the patient."""
+        if self._entries.pop(patient_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def close(self):
+        """Stop listening for changes; the cache must not be used afterwards."""
+        remove_patient_listener(self.invalidate)
+        self._entries.clear()
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations, 'evictions': self.evictions, 'size': len(self._entries)}
+
+
+class HashIndex:
+    """Secondary index mapping the exact value of a patient field to the patients that have it"""
+
+    # Constructor
+    def __init__(self, field):
+        self._getter = getattr(Patient, f'get_{field}')
+        self._buckets = {}  # maps a field value to {patient_id: patient}
+        # maps patient_id to the value it is indexed under, so a patient whose field was changed
+        # directly (not through the record system) is still removed from the right bucket
+        self._values = {}
+
+    def add(self, patient):
+        patient_id = patient.get_patient_id()
+        if patient_id in self._values:
+            self.remove(patient)  # re-index under the current value
+        value = self._values[patient_id] = self._getter(patient)
+        self._buckets.setdefault(value, {})[patient_id] = patient
+
+    def add_many(self, patients):
+        for patient in patients:
+            self.add(patient)
+
+    def remove(self, patient):
+        patient_id = patient.get_patient_id()
+        if patient_id not in self._values:
+            return
+        value = self._values.pop(patient_id)
+        bucket = self._buckets[value]
+        del bucket[patient_id]
+        if not bucket:
+            del self._buckets[value]
+
+    def remove_many(self, patients):
+        for patient in patients:
+            self.remove(patient)
+
+    def find(self, value):
+        return list(self._buckets.get(value, {}).values())
+
+
+class SortedIndex:
+    """Secondary index keeping patients sorted by a date field, for range scans"""
+
+    # Constructor
+    def __init__(self, field):
+        self._getter = getattr(Patient, f'get_{field}')
+        self._entries = []  # sorted (date key, patient ID key, patient_id) tuples
+        self._patients = {}  # maps patient_id to patient
+        # maps patient_id to its entry, so a patient whose date was changed directly (not through the
+        # record system) is still removed by the entry it was indexed under
+        self._entry_of = {}
+
+    def _entry(self, patient):
+        patient_id = patient.get_patient_id()
+        # date_key normalizes '2024-4-1' and '2024-04-01' to the same integer, so the order is by date
+        return (date_key(self._getter(patient)), patient_id_key(patient_id), patient_id)
+
+    def add(self, patient):
+        entry = self._entry(patient)
+        if entry[2] in self._entry_of:
+            self.remove(patient)  # re-index under the current date
+        self._entries.insert(bisect_right(self._entries, entry), entry)
+        self._patients[entry[2]] = patient
+        self._entry_of[entry[2]] = entry
+
+    def add_many(self, patients):
+        """Add many patients with one sort, which merges the new entries into the sorted ones."""
+        entries = {}
+        for patient in patients:
+            entry = self._entry(patient)
+            entries[entry[2]] = entry
+            self._patients[entry[2]] = patient
+        stale = {self._entry_of[patient_id] for patient_id in entries if patient_id in self._entry_of}
+        if stale:
+            self._entries = [entry for entry in self._entries if entry not in stale]
+        self._entry_of.update(entries)
+        self._entries.extend(entries.values())
+        self._entries.sort()
+
+    def remove(self, patient):
+        entry = self._entry_of.pop(patient.get_patient_id(), None)
+        if entry is not None:
+            del self._entries[bisect_left(self._entries, entry)]
+            del self._patients[entry[2]]
+
+    def remove_many(self, patients):
+        """Remove many patients in one pass over the entries, instead of one shift per patient."""
+        entries = set()
+        for patient in patients:
+            entry = self._entry_of.pop(patient.get_patient_id(), None)
+            if entry is not None:
+                entries.add(entry)
+                del self._patients[entry[2]]
+        if entries:
+            self._entries = [entry for entry in self._entries if entry not in entries]
+
+    def find(self, value):
+        return self.find_range(value, value)
+
+    def find_range(self, start, end):
+        """Return the patients whose date is between start and end (inclusive), ordered by date."""
+        low = bisect_left(self._entries, (date_key(start),))
+        high = bisect_left(self._entries, (date_key(end) + 1,))
+        return [self._patients[entry[2]] for entry in self._entries[low:high]]
+
+
+class FullTextIndex:
+    """
+    Inverted index over the words of the patients' medical history and of their record's diagnosis and
+    treatment plan, for queries such as 'penicillin', 'allerg*' or 'asthma OR diabetes'.
+    Each field maps every word to the set of IDs of the patients whose text contains it. Words are interned
+    and the sets hold the patients' own ID strings, and the words of a text are cached, so the histories
+    that many patients share are only tokenized once. The index is kept up to date by the record system
+    it belongs to (add, update, delete) and by listening for changes made directly on patients and records
+    (see add_patient_listener).
+    """
+    FIELDS = ('medical_history', 'diagnosis', 'treatment_plan')
+    TOKEN = re.compile(r"[a-z0-9]+")
+
+    # Constructor
+    def __init__(self, record_system):
+        self._record_system = record_system
+        self._postings = {field: {} for field in self.FIELDS}  # field -> word -> set of patient IDs
+        self._sorted_words = {field: [] for field in self.FIELDS}  # field -> sorted words, for prefix queries
+        self._patient_texts = {}  # patient_id -> tuple of its indexed text per field (None when missing)
+        add_patient_listener(self._patient_changed)
 
-    # Function to schedule an appointment - it will check in the doctors dictionary
-    def schedule_appointment(self, new_appointment):
-        # Assuming new_appointment is an Appointment object
-        self._appointments.append(new_appointment)
+    def __len__(self):
+        return len(self._patient_texts)
+
+    @staticmethod
+    def _field_texts(patient):
+        # The patient's text per field, None where it has none
+        history = patient.get_medical_history()
+        if not isinstance(history, str):
+            history = None
+        record = patient.get_record()
+        if record is None:
+            return (history, None, None)
+        diagnosis, treatment_plan = record.get_diagnosis(), record.get_treatment_plan()
+        return (history, diagnosis if isinstance(diagnosis, str) else None,
+                treatment_plan if isinstance(treatment_plan, str) else None)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1 << 16)
+    def tokenize(text):
+        """Return the distinct lowercase words of text."""
+        return frozenset(sys.intern(word) for word in FullTextIndex.TOKEN.findall(text.lower()))
+
+    def _add_text(self, field, text, patient_id):
+        postings = self._postings[field]
+        for word in self.tokenize(text):
+            patients = postings.get(word)
+            if patients is None:
+                patients = postings[word] = set()
+                sorted_words = self._sorted_words[field]
+                sorted_words.insert(bisect_left(sorted_words, word), word)
+            patients.add(patient_id)
+
+    def _remove_text(self, field, text, patient_id):
+        postings = self._postings[field]
+        for word in self.tokenize(text):
+            patients = postings[word]
+            patients.discard(patient_id)
+            if not patients:
+                del postings[word]
+                sorted_words = self._sorted_words[field]
+                del sorted_words[bisect_left(sorted_words, word)]
+
+    def add(self, patient):
+        """Index the patient's current texts, replacing what was indexed for it before."""
+        patient_id = patient.get_patient_id()
+        new_texts = self._field_texts(patient)
+        old_texts = self._patient_texts.get(patient_id)
+        if old_texts == new_texts:
+            return
+        for field, old_text, new_text in zip(self.FIELDS, old_texts or (None,) * len(self.FIELDS), new_texts):
+            if old_text != new_text:
+                if old_text is not None:
+                    self._remove_text(field, old_text, patient_id)
+                if new_text is not None:
+                    self._add_text(field, new_text, patient_id)
+        self._patient_texts[patient_id] = new_texts
+
+    def add_many(self, patients):
+        """
+        Index many patients in one pass: patients are grouped by text first, so every distinct text is
+        tokenized once and each of its words gets all of its patients in a single set update.
+        """
+        groups = {field: defaultdict(list) for field in self.FIELDS}  # field -> text -> patient IDs
+        histories, diagnoses, treatment_plans = (groups[field] for field in self.FIELDS)
+        indexed, field_texts = self._patient_texts, self._field_texts
+        # Millions of new tuples and lists would trigger many full garbage collections, none of which
+        # can free anything here, so the collector is paused for the bulk build
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for patient in patients:
+                patient_id = patient.get_patient_id()
+                if patient_id in indexed:
+                    self.add(patient)  # already indexed, replace its texts one by one
+                    continue
+                texts = indexed[patient_id] = field_texts(patient)
+                history, diagnosis, treatment_plan = texts
+                if history is not None:
+                    histories[history].append(patient_id)
+                if diagnosis is not None:
+                    diagnoses[diagnosis].append(patient_id)
+                if treatment_plan is not None:
+                    treatment_plans[treatment_plan].append(patient_id)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        for field, by_text in groups.items():
+            postings = self._postings[field]
+            for text, patient_ids in by_text.items():
+                for word in self.tokenize(text):
+                    patients = postings.get(word)
+                    if patients is None:
+                        patients = postings[word] = set()
+                    patients.update(patient_ids)
+            if by_text:
+                self._sorted_words[field] = sorted(postings)
+
+    def remove(self, patient):
+        patient_id = patient.get_patient_id() if isinstance(patient, Patient) else patient
+        old_texts = self._patient_texts.pop(patient_id, None)
+        if old_texts is not None:
+            for field, text in zip(self.FIELDS, old_texts):
+                if text is not None:
+                    self._remove_text(field, text, patient_id)
+
+    def remove_many(self, patients):
+        for patient in patients:
+            self.remove(patient)
+
+    def _patient_changed(self, patient_id, field):
+        # Re-index a patient of this record system whose history or record was changed directly
+        if field in ('medical_history', 'record') and patient_id in self._patient_texts:
+            lock = getattr(self._record_system, 'lock', None)  # set on a ConcurrentPatientRecordSystem
+            if lock is not None:
+                lock.acquire_write()
+            try:
+                patient = self._record_system.search_patient(patient_id)
+                if patient is not None:
+                    self.add(patient)
+            finally:
+                if lock is not None:
+                    lock.release_write()
+
+    def close(self):
+        """Stop listening for changes; the index is no longer kept up to date afterwards."""
+        remove_patient_listener(self._patient_changed)
+
+    def _postings_for(self, term, fields):
+        # The posting sets of the word term in the given fields, or of every word starting with it if
+        # term ends in '*'; they belong to the index and must not be modified
+        sets = []
+        for field in fields or self.FIELDS:
+            postings = self._postings[field]
+            if not term.endswith('*'):
+                patients = postings.get(term)
+                if patients:
+                    sets.append(patients)
+                continue
+            prefix = term[:-1]
+            sorted_words = self._sorted_words[field]
+            for index in range(bisect_left(sorted_words, prefix), len(sorted_words)):
+                word = sorted_words[index]
+                if not word.startswith(prefix):
+                    break
+                sets.append(postings[word])
+        return sets
+
+    def _term_patients(self, term, fields):
+        # The patients matching one term, possibly as one of the index's own sets (read-only)
+        sets = self._postings_for(term, fields)
+        if len(sets) == 1:
+            return sets[0]
+        return set().union(*sets)
+
+    def find_term(self, term, fields=None):
+        """Return the set of IDs of the patients with the word term (or a word starting with it, for 'term*')."""
+        return set(self._term_patients(term.lower(), fields))
+
+    def search(self, query, fields=None):
+        """
+        Return the set of IDs of the patients matching query, e.g. 'penicillin allergic' (both words),
+        'asthma OR diabetes' (either word) or 'inflam*' (a prefix). AND binds tighter than OR.
+        fields restricts the search to some of FIELDS, e.g. ('diagnosis',).
+        """
+        result = set()
+        for group in re.split(r"\s+OR\s+", query.strip()):
+            terms = [term.lower() for term in group.split() if term != 'AND']
+            if not terms:
+                continue
+            # Intersect starting from the smallest set: each step only walks the smaller operand
+            matches = sorted((self._term_patients(term, fields) for term in terms), key=len)
+            patients = matches[0]
+            for other in matches[1:]:
+                if not patients:
+                    break
+                patients = patients & other
+            result |= patients
+        return result
+
+    def find(self, query):
+        """Return the patients matching query, ordered by patient ID (used by find_patients('full_text', ...))."""
+        patient_ids = sorted(self.search(query), key=patient_id_key)
+        return [self._record_system.search_patient(patient_id) for patient_id in patient_ids]
+
+
+class PatientCursor:
+    """
+    Resumable position in the patients of a record system, in patient ID order, for paging through them.
+    The position is the ID of the last patient returned, so patients added or deleted between two pages
+    never make the cursor skip or repeat a patient. Keep get_position() to resume later with
+    record_system.cursor(after=position).
+    """
+
+    # Constructor
+    def __init__(self, record_system, after=None, page_size=100):
+        self._record_system = record_system  # PatientRecordSystem, or anything else with get_page
+        self._after = after  # ID of the last patient returned, None before the first page
+        self.page_size = page_size  # patients fetched at a time when iterating
+
+    def get_position(self):
+        return self._after
+
+    def fetch(self, count=None):
+        """Return the next count (by default page_size) patients and move past them; [] at the end."""
+        page = self._record_system.get_page(count or self.page_size, self._after)
+        if page:
+            self._after = page[-1].get_patient_id()
+        return page
+
+    # Iteration over the remaining patients, one page in memory at a time
+    def __iter__(self):
+        page = self.fetch()
+        while page:
+            yield from page
+            page = self.fetch()
 
 
 class PatientRecordSystem:
     """Class to manage the patient records"""
 
     # Constructor
-    def __init__(self, max_patients):
+    def __init__(self, max_patients, ordered_insert=True, growable=False, compaction_threshold=0.25):
         self.max_patients = max_patients
         self.records = [None] * max_patients
         self.next_index = 0
-        self.patient_index_map = {}  # This will map patient_id to index in the records list
+        # This will map patient_id to index in the records list; after an insert in the middle the
+        # entries behind it lag, and are corrected by _locate when they are used (see patient_index_map)
+        self._index_hints = {}
+        self._stale_from = None  # Lowest slot whose _index_hints entry may lag, None while all are exact
+        self.ordered_insert = ordered_insert  # Place new patients at their sorted position instead of re-sorting
+        self.growable = growable  # Double the records array when it is full instead of refusing new patients
+        self.compaction_threshold = compaction_threshold  # Fraction of deleted slots that triggers a compaction
+        self._id_keys = []  # Sort keys of the patient IDs in the used slots, parallel to self.records
+        self._ordered_by_id = True  # False once the records have been sorted on another field
+        self._tombstones = 0  # Number of deleted slots below next_index that still hold their ID key
+        self._indexes = {}  # maps a field name to its HashIndex or SortedIndex
+        self.journal = None  # PatientRecordJournal that logs every change, if persistence is enabled
+        self.summary_cache = None  # SummaryCache of the printed summaries, if caching is enabled
+
+    @property
+    def patient_index_map(self):
+        """Map of patient_id to the index of its record, first corrected for records shifted by inserts."""
+        if self._stale_from is not None:
+            self._reindex_from(self._stale_from)
+        return self._index_hints
+
+    def __len__(self):
+        # Every used slot below next_index holds a patient, except the tombstones
+        return self.next_index - self._tombstones
+
+    # Iteration over the patients in record order (ID order unless re-sorted), skipping deleted slots;
+    # use a cursor to page through the records while they are being changed
+    def __iter__(self):
+        records = self.records
+        for index in range(self.next_index):
+            if records[index] is not None:
+                yield records[index]
+
+    def __reversed__(self):
+        records = self.records
+        for index in range(self.next_index - 1, -1, -1):
+            if records[index] is not None:
+                yield records[index]
+
+    def get_page(self, page_size, after=None):
+        """
+        Return up to page_size patients in patient ID order, starting after the patient ID after
+        (from the first patient when None). Only the page itself is built.
+        """
+        if not self._ordered_by_id:
+            # The records are ordered on another field: pick the next IDs without sorting all of them
+            after_key = None if after is None else patient_id_key(after)
+            patient_ids = heapq.nsmallest(page_size, (patient_id for patient_id in self._index_hints
+                                                      if after_key is None or patient_id_key(patient_id) > after_key),
+                                          key=patient_id_key)
+            return [self.search_patient(patient_id) for patient_id in patient_ids]
+        records, page = self.records, []
+        index = 0 if after is None else bisect_right(self._id_keys, patient_id_key(after))
+        while index < self.next_index and len(page) < page_size:
+            if records[index] is not None:
+                page.append(records[index])
+            index += 1
+        return page
+
+    def cursor(self, after=None, page_size=100):
+        """Return a PatientCursor over the patients in ID order, starting after the patient ID after."""
+        return PatientCursor(self, after, page_size)
+
+    def create_index(self, field, kind=None):
+        """
+        Declare a secondary index on a patient field, e.g. 'name', 'phone' or 'admission_date'.
+        kind is 'hash' for exact lookups or 'sorted' for range scans; by default date fields are sorted.
+        The index is built from the current records and kept up to date by add, update and delete.
+        """
+        if kind is None:
+            kind = 'sorted' if field.endswith('date') or field == 'date_of_birth' else 'hash'
+        index = SortedIndex(field) if kind == 'sorted' else HashIndex(field)
+        for patient in self.records[:self.next_index]:
+            if patient is not None:
+                index.add(patient)
+        self._indexes[field] = index
+
+    def find_patients(self, field, value):
+        """Return the patients whose field equals value, using the field's secondary index."""
+        index = self._indexes.get(field)
+        if index is None:
+            print(f"No index on {field}, call create_index first.")
+            return []
+        return index.find(value)
+
+    def create_text_index(self):
+        """
+        Build a FullTextIndex over the medical histories, diagnoses and treatment plans of the records,
+        kept up to date from then on, and return it. Query it with search_text.
+        """
+        index = self._indexes.get('full_text')
+        if index is None:
+            index = FullTextIndex(self)
+            index.add_many(patient for patient in self.records[:self.next_index] if patient is not None)
+            self._indexes['full_text'] = index
+        return index
+
+    def search_text(self, query, fields=None):
+        """Return the set of IDs of the patients matching a full-text query (see FullTextIndex.search)."""
+        index = self._indexes.get('full_text')
+        if index is None:
+            print("No full-text index, call create_text_index first.")
+            return set()
+        return index.search(query, fields)
+
+    def find_patients_in_range(self, field, start, end):
+        """Return the patients whose date field is between start and end (inclusive), ordered by that date."""
+        index = self._indexes.get(field)
+        if not isinstance(index, SortedIndex):
+            print(f"No sorted index on {field}, call create_index first.")
+            return []
+        return index.find_range(start, end)
+
+    def _add_to_indexes(self, patient):
+        for index in self._indexes.values():
+            index.add(patient)
+
+    def _remove_from_indexes(self, patient):
+        for index in self._indexes.values():
+            index.remove(patient)
+
+    def _indexes_on(self, fields):
+        # The secondary indexes that depend on any of the given patient fields
+        return [index for field, index in self._indexes.items()
+                if field in fields or (field == 'full_text' and 'medical_history' in fields)]
 
     def sort_patient_records(self, sort_key):
-        """ Sorts the patient records based on the sort_key using quicksort. """
+        """ Sorts the patient records based on the sort_key (a field name or a tuple of field names). """
         if self.records:
             # Ensure we're not trying to sort where records might be None
             filled_records = [record for record in self.records if record is not None]
-            # Call the quicksort_records method
-            Patient.quicksort_records(filled_records, 0, len(filled_records) - 1, sort_key)
-            # Reassign sorted records back to self.records
-            self.records = filled_records + [None] * (self.max_patients - len(filled_records))
-            # Update the index map after sorting
-            self.patient_index_map = {
-                patient.get_patient_id(): index for index, patient in enumerate(filled_records)
-            }
+            # Call the sort_records method
+            Patient.sort_records(filled_records, sort_key)
+            self._load_sorted(filled_records, sort_key)
+
+    def _load_sorted(self, filled_records, sort_key, id_keys=None):
+        """Replace the records by filled_records, already sorted on sort_key, and rebuild the lookups."""
+        # Reassign sorted records back to self.records
+        self.records = filled_records + [None] * (self.max_patients - len(filled_records))
+        self.next_index = len(filled_records)
+        self._tombstones = 0
+        # Update the index map after sorting
+        self._index_hints = {
+            patient.get_patient_id(): index for index, patient in enumerate(filled_records)
+        }
+        self._stale_from = None
+        if id_keys is None:
+            id_keys = [patient_id_key(patient.get_patient_id()) for patient in filled_records]
+        self._id_keys = id_keys
+        # Binary search by ID only works while the records are ordered by patient ID
+        self._ordered_by_id = isinstance(sort_key, str) and sort_key.lower().lstrip('_') == 'patient_id'
+
+    def _reindex_from(self, start):
+        """Refresh _index_hints for the filled slots from start onwards."""
+        records = self.records
+        index_map = self._index_hints
+        for index in range(start, self.next_index):
+            if records[index] is not None:
+                index_map[records[index].get_patient_id()] = index
+        if self._stale_from is not None and start <= self._stale_from:
+            self._stale_from = None
+
+    def compact(self):
+        """
+        Close the slots left by deleted patients in one pass.
+        The order of the remaining records is kept, so only their indices need refreshing.
+        """
+        if not self._tombstones:
+            return
+        records = self.records
+        first_gap = records.index(None, 0, self.next_index)
+        live_indices = [index for index in range(first_gap, self.next_index) if records[index] is not None]
+        self.records = (records[:first_gap] + [records[index] for index in live_indices]
+                        + [None] * (self.max_patients - first_gap - len(live_indices)))
+        self._id_keys = self._id_keys[:first_gap] + [self._id_keys[index] for index in live_indices]
+        self.next_index = first_gap + len(live_indices)
+        self._tombstones = 0
+        self._reindex_from(first_gap)
+
+    def _reserve(self, count):
+        """Make room for count more patients at the end of the records array, growing it if needed."""
+        if self.next_index + count <= self.max_patients:
+            return
+        self.compact()
+        if self.next_index + count > self.max_patients:
+            extra = max(self.max_patients, self.next_index + count - self.max_patients)
+            self.records.extend([None] * extra)
+            self.max_patients += extra
+
+    def _make_room(self):
+        """Free one slot at the end of the records array, returns False if the system is full."""
+        if self.next_index < self.max_patients:
+            return True
+        if self._tombstones:
+            self.compact()
+            return True
+        if self.growable:
+            # Doubling the capacity keeps the cost of growing amortized O(1) per insert
+            extra = max(self.max_patients, 1)
+            self.records.extend([None] * extra)
+            self.max_patients += extra
+            return True
+        return False
 
     def add_patient(self, patient):
-        if self.next_index < self.max_patients:
-            self.records[self.next_index] = patient
-            self.patient_index_map[patient.get_patient_id()] = self.next_index
+        patient_id = patient.get_patient_id()
+        if patient_id in self._index_hints:
+            print(f"Patient with ID {patient_id} already exists.")
+            return
+        if not self._make_room():
+            print("Patient record system is full, cannot add more patients.")
+            return
+
+        key = patient_id_key(patient_id)
+        if self.ordered_insert and self._ordered_by_id:
+            # Find the sorted position of the new patient, equal keys keep their insertion order
+            position = bisect_right(self._id_keys, key)
+        else:
+            position = self.next_index
+
+        if position == self.next_index:
+            # Most new IDs are the highest so far, so this is the common O(1) case
+            self.records[position] = patient
+            self._id_keys.append(key)
+            self._index_hints[patient_id] = position
             self.next_index += 1
-            self.sort_patient_records('Patient_id')  # Sort after adding
+        elif position > 0 and self.records[position - 1] is None:
+            # Reuse the deleted slot right before the sorted position, nothing has to shift
+            position -= 1
+            self.records[position] = patient
+            self._id_keys[position] = key
+            self._index_hints[patient_id] = position
+            self._tombstones -= 1
+        elif self.records[position] is None:
+            # Reuse the deleted slot at the sorted position, its old key is larger than the new one
+            self.records[position] = patient
+            self._id_keys[position] = key
+            self._index_hints[patient_id] = position
+            self._tombstones -= 1
         else:
-            print("Patient record system is full, cannot add more patients.")
+            # Shift the tail one slot to the right and drop one trailing empty slot; the map entries
+            # of the shifted records are left behind and corrected on use, instead of all of them now
+            self.records.insert(position, patient)
+            self.records.pop()
+            self._id_keys.insert(position, key)
+            self._index_hints[patient_id] = position
+            self.next_index += 1
+            if self._stale_from is None or position < self._stale_from:
+                self._stale_from = position + 1
+
+        self._add_to_indexes(patient)
+        if self.journal is not None:
+            self.journal.log('add_patient', **PatientRecordJournal.patient_to_dict(patient))
+        if not self.ordered_insert:
+            self.sort_patient_records('Patient_id')  # Sort after adding
+
+    def _locate(self, patient_id):
+        """Return the index of the record of patient_id, or None, correcting its map entry if it lags."""
+        index = self._index_hints.get(patient_id)
+        if index is None:
+            return None
+        patient = self.records[index]
+        if patient is not None and patient.get_patient_id() == patient_id:
+            return index
+        # Inserts before the record only ever shift it to the right, so search the ID keys from there
+        key = patient_id_key(patient_id)
+        records = self.records
+        index = bisect_left(self._id_keys, key, index)
+        while index < self.next_index and self._id_keys[index] == key:
+            if records[index] is not None and records[index].get_patient_id() == patient_id:
+                self._index_hints[patient_id] = index
+                return index
+            index += 1
+        return None
 
     def search_patient(self, patient_id):
-        index = self.patient_index_map.get(patient_id)
+        index = self._locate(patient_id)
         if index is not None:
             return self.records[index]
         return None
@@ -290,6 +1344,7 @@ class PatientRecordSystem:
                        admission_date=None):
         patient = self.search_patient(patient_id)
         if patient:
+            self._remove_from_indexes(patient)  # The indexes are keyed on the old values
             if name:
                 patient.set_name(name)
             if date_of_birth:
@@ -300,126 +1355,808 @@ class PatientRecordSystem:
                 patient.set_phone(phone)
             if admission_date:
                 patient.set_admission_date(admission_date)
-            self.sort_patient_records('Patient_id')  # Sort after update
+            self._add_to_indexes(patient)
+            # The patient ID never changes, so the record keeps its position
+            if self.journal is not None:
+                changes = {'name': name, 'date_of_birth': date_of_birth, 'medical_history': medical_history,
+                           'phone': phone, 'admission_date': admission_date}
+                self.journal.log('update_patient', patient_id=patient_id,
+                                 **{field: value for field, value in changes.items() if value})
         else:
             print(f"No record found for patient_id {patient_id}")
 
-    def delete_patient(self, patient_id):
-        index = self.patient_index_map.get(patient_id)
-        if index is not None:
-            # Set the record to None, indicating deletion
-            self.records[index] = None
+    def _remove_patient(self, patient_id):
+        """Delete a patient without printing, returns False if there is no record for patient_id."""
+        index = self._locate(patient_id)
+        if index is None:
+            return False
+        self._remove_from_indexes(self.records[index])
+        # Leave a tombstone: the slot is emptied but keeps its ID key, so the order stays valid
+        self.records[index] = None
+        self._tombstones += 1
+
+        # Remove the patient from the map
+        del self._index_hints[patient_id]
+        if _patient_listeners:
+            _patient_changed(patient_id, 'deleted')
+        if self.journal is not None:
+            self.journal.log('delete_patient', patient_id=patient_id)
+
+        # Close the gaps in one batch once enough of them have piled up
+        if self._tombstones > self.compaction_threshold * self.next_index:
+            self.compact()
+        return True
 
-            # Remove the patient from the map
-            del self.patient_index_map[patient_id]
+    def delete_patient(self, patient_id):
+        if self._remove_patient(patient_id):
             print(f"Patient record for patient_id {patient_id} deleted.")
-
         else:
             print(f"No record found for patient_id {patient_id}")
 
-        # Re-sort the records after deletion to fill the gap and maintain order
-        self.sort_patient_records('Patient_id')
+    # Fields that update_patient and update_many can change
+    UPDATABLE_FIELDS = ('name', 'date_of_birth', 'medical_history', 'phone', 'admission_date')
 
-    def binary_search_patient(self, patient_id):
+    def add_patients(self, patients):
         """
-        Perform a binary search on the sorted list of patient records.
+        Add many patients at once, without printing. Returns one result per patient, in input order:
+        {'patient_id': ..., 'status': 'added'}, or status 'duplicate' (the ID is already taken) or 'full'.
+        The new patients are sorted once and merged into the records in a single pass, and every
+        secondary index is updated once, instead of paying a shift and an index insert per patient.
         """
-        left, right = 0, self.next_index - 1  # Adjusted to next_index since records are populated sequentially
-
-        while left <= right:
-            mid = (left + right) // 2
-            if self.records[mid] is None:  # Skip empty record slots
-                right = mid - 1
-                continue
-
-            mid_id = self.records[mid].get_patient_id()
-            if mid_id == patient_id:
-                return self.records[mid]
-            elif mid_id < patient_id:
-                left = mid + 1
+        results, accepted, accepted_ids = [], [], set()
+        index_map = self._index_hints
+        free = self.max_patients - self.next_index + self._tombstones
+        for patient in patients:
+            patient_id = patient.get_patient_id()
+            if patient_id in index_map or patient_id in accepted_ids:
+                status = 'duplicate'
+            elif len(accepted) >= free and not self.growable:
+                status = 'full'
+            else:
+                status = 'added'
+                accepted.append(patient)
+                accepted_ids.add(patient_id)
+            results.append({'patient_id': patient_id, 'status': status})
+        if not accepted:
+            return results
+
+        keys = [patient_id_key(patient.get_patient_id()) for patient in accepted]
+        if self.ordered_insert and self._ordered_by_id:
+            order = _sorted_order(keys)
+            new_records = [accepted[index] for index in order]
+            keys = [keys[index] for index in order]
+            if self._id_keys and keys[0] < self._id_keys[-1]:
+                # Some new IDs fall between the existing ones: merge both sorted runs in one sort,
+                # which keeps an existing record before a new one with an equal key, like add_patient
+                self.compact()
+                self._reserve(len(new_records))
+                records = self.records[:self.next_index] + new_records
+                id_keys = self._id_keys + keys
+                order = _sorted_order(id_keys)
+                self._load_sorted([records[index] for index in order], 'Patient_id',
+                                  [id_keys[index] for index in order])
+                new_records = None
+        else:
+            new_records = accepted
+        if new_records is not None:
+            # Every new patient goes after the existing records
+            self._reserve(len(new_records))
+            start = self.next_index
+            self.records[start:start + len(new_records)] = new_records
+            self._id_keys.extend(keys)
+            index_map.update((patient.get_patient_id(), start + offset) for offset, patient in enumerate(new_records))
+            self.next_index += len(new_records)
+            if not self.ordered_insert:
+                self.sort_patient_records('Patient_id')
+
+        for index in self._indexes.values():
+            index.add_many(accepted)
+        if self.journal is not None:
+            self.journal.log_many('add_patient', map(PatientRecordJournal.patient_to_dict, accepted))
+        return results
+
+    def update_many(self, updates):
+        """
+        Apply many updates at once, without printing. updates holds (patient_id, changes) pairs, where changes
+        maps fields of UPDATABLE_FIELDS to their new value (empty values are ignored, as in update_patient).
+        Returns one result per update, in input order: {'patient_id': ..., 'status': 'updated'}, or status
+        'not_found' or 'invalid' (an unknown field; nothing of that update is applied).
+        Only the secondary indexes on changed fields are updated, once for the whole batch.
+        """
+        results, changed, changed_fields = [], [], set()
+        updatable = set(self.UPDATABLE_FIELDS)
+        for patient_id, changes in updates:
+            patient = self.search_patient(patient_id)
+            if changes.keys() - updatable:
+                status = 'invalid'
+            elif patient is None:
+                status = 'not_found'
             else:
-                right = mid - 1
+                status = 'updated'
+                changes = {field: value for field, value in changes.items() if value}
+                changed.append((patient, changes))
+                changed_fields.update(changes)
+            results.append({'patient_id': patient_id, 'status': status})
+
+        indexes = self._indexes_on(changed_fields)
+        if indexes:
+            # The indexes are keyed on the old values; a patient updated twice is re-indexed once
+            patients = list({patient.get_patient_id(): patient for patient, changes in changed}.values())
+            for index in indexes:
+                index.remove_many(patients)
+        for patient, changes in changed:
+            for field, value in changes.items():
+                getattr(patient, f'set_{field}')(value)
+        if indexes:
+            for index in indexes:
+                index.add_many(patients)
+        if self.journal is not None:
+            self.journal.log_many('update_patient', (dict(changes, patient_id=patient.get_patient_id())
+                                                     for patient, changes in changed))
+        return results
+
+    def delete_patients(self, patient_ids):
+        """
+        Delete many patients at once, without printing. Returns one result per ID, in input order:
+        {'patient_id': ..., 'status': 'deleted'} or status 'not_found'.
+        The secondary indexes are updated and the records compacted at most once for the whole batch.
+        """
+        results, removed = [], []
+        records, index_map = self.records, self._index_hints
+        for patient_id in patient_ids:
+            index = self._locate(patient_id)
+            if index is None:
+                results.append({'patient_id': patient_id, 'status': 'not_found'})
+                continue
+            removed.append(records[index])
+            records[index] = None  # a tombstone, as in _remove_patient
+            del index_map[patient_id]
+            results.append({'patient_id': patient_id, 'status': 'deleted'})
+        if not removed:
+            return results
+        self._tombstones += len(removed)
+
+        for index in self._indexes.values():
+            index.remove_many(removed)
+        if _patient_listeners:
+            for patient in removed:
+                _patient_changed(patient.get_patient_id(), 'deleted')
+        if self.journal is not None:
+            self.journal.log_many('delete_patient', ({'patient_id': patient.get_patient_id()} for patient in removed))
+        if self._tombstones > self.compaction_threshold * self.next_index:
+            self.compact()
+        return results
 
+    def binary_search_patient(self, patient_id):
+        """
+        Perform a binary search on the sorted list of patient records.
+        """
+        if not self._ordered_by_id:
+            return self.search_patient(patient_id)  # The records are ordered on another field
+
+        key = patient_id_key(patient_id)
+        index = bisect_left(self._id_keys, key)
+        # Deleted slots keep their key, so skip over them to the live record with the same ID
+        while index < self.next_index and self._id_keys[index] == key:
+            if self.records[index] is not None:
+                return self.records[index]
+            index += 1
         return None  # Patient not found
 
+    @staticmethod
+    def render_patient_summary(patient):
+        """Return the text printed by print_patient_summary for a patient."""
+        lines = [f"Patient ID: {patient.get_patient_id()}", f"Name: {patient.get_name()}",
+                 f"Date of Birth: {patient.get_date_of_birth()}",
+                 f"Medical History: {patient.get_medical_history()}", f"Phone: {patient.get_phone()}",
+                 f"Admission Date: {patient.get_admission_date()}"]
+
+        # Assuming a patient can have only one appointment and one doctor at a time
+        # (read the lazy containers directly, so rendering does not create them)
+        appointment = patient._appointments[0] if patient._appointments else None
+        if appointment:
+            doctor = Doctor.doctors.get(appointment.get_doctor_id())
+            doctor_name = doctor.get_name() if doctor is not None else appointment.get_doctor_id()
+            lines.append(f"Appointment with Dr. {doctor_name} on {appointment.get_date()} at "
+                         f"{appointment.get_time()}. Reason: {appointment.get_reason()}")
+
+        # Assuming the prescription stack stores all prescriptions for the patient
+        if patient._prescriptions is not None and not patient._prescriptions.is_empty():
+            current_prescription = patient._prescriptions.peek()
+            lines.append(f"Current Prescription: {current_prescription.get_medication()} for "
+                         f"{current_prescription.get_duration()}")
+        else:
+            lines.append("No current prescriptions.")
+        return "\n".join(lines)
+
     def print_patient_summary(self, patient_id):
         """
         Search for a patient using binary search and display their details,
         including personal details, doctor, appointment, and medications.
+        The text comes from summary_cache when one is set.
         """
         patient = self.binary_search_patient(patient_id)
         if patient is not None:
-            print(f"Patient ID: {patient.get_patient_id()}")
-            print(f"Name: {patient.get_name()}")
-            print(f"Date of Birth: {patient.get_date_of_birth()}")
-            print(f"Medical History: {patient.get_medical_history()}")
-            print(f"Phone: {patient.get_phone()}")
-            print(f"Admission Date: {patient.get_admission_date()}")
-
-            # Assuming a patient can have only one appointment and one doctor at a time
-            appointment = patient.get_appointments()[0] if patient.get_appointments() else None
-            if appointment:
-                doctor_id = appointment.get_doctor_id()
-                doctor = Doctor.doctors[doctor_id]
-                print(
-                    f"Appointment with Dr. {doctor.get_name()} on {appointment.get_date()} at {appointment.get_time()}. Reason: {appointment.get_reason()}")
-
-            # Assuming the prescription stack stores all prescriptions for the patient
-            if not patient.get_prescriptions().is_empty():
-                current_prescription = patient.get_prescriptions().peek()
-                print(
-                    f"Current Prescription: {current_prescription.get_medication()} for {current_prescription.get_duration()}")
+            if self.summary_cache is not None:
+                print(self.summary_cache.get(patient, 'record_system', PatientRecordSystem.render_patient_summary))
             else:
-                print("No current prescriptions.")
+                print(self.render_patient_summary(patient))
         else:
             print("Patient not found.")
 
 
+class ReadWriteLock:
+    """
+    Lock that lets any number of threads read at the same time, or one thread write.
+    It is reentrant: a thread holding the write lock may take it again or read, and a reader may read again.
+    Waiting writers go first, so a steady stream of readers cannot starve them.
+    """
+
+    # Constructor
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = {}  # maps the ident of each reading thread to its read depth
+        self._writer = None  # ident of the writing thread
+        self._write_depth = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers[me] = 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._condition:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+            if me in self._readers:
+                raise RuntimeError("A thread holding the read lock cannot take the write lock")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        with self._condition:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._condition.notify_all()
+
+
+def _read_locked(method):
+    # Run method while holding the read lock of the record system
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        self.lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.lock.release_read()
+    return locked
+
+
+def _write_locked(method):
+    # Run method while holding the write lock of the record system
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        self.lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.lock.release_write()
+    return locked
+
+
+class ConcurrentPatientRecordSystem(PatientRecordSystem):
+    """
+    PatientRecordSystem that can be shared between threads.
+    Lookups hold a read lock, so they run side by side; changes hold the write lock, so the records,
+    patient_index_map, the ID keys and the secondary indexes are never seen half-updated.
+    Code that reads records or next_index directly should hold lock.acquire_read() while it does.
+    """
+
+    # Constructor
+    def __init__(self, max_patients, ordered_insert=True, growable=False, compaction_threshold=0.25):
+        super().__init__(max_patients, ordered_insert, growable, compaction_threshold)
+        self.lock = ReadWriteLock()
+
+    search_patient = _read_locked(PatientRecordSystem.search_patient)
+    binary_search_patient = _read_locked(PatientRecordSystem.binary_search_patient)
+    find_patients = _read_locked(PatientRecordSystem.find_patients)
+    find_patients_in_range = _read_locked(PatientRecordSystem.find_patients_in_range)
+    print_patient_summary = _read_locked(PatientRecordSystem.print_patient_summary)
+    add_patient = _write_locked(PatientRecordSystem.add_patient)
+    update_patient = _write_locked(PatientRecordSystem.update_patient)
+    _remove_patient = _write_locked(PatientRecordSystem._remove_patient)
+    sort_patient_records = _write_locked(PatientRecordSystem.sort_patient_records)
+    compact = _write_locked(PatientRecordSystem.compact)
+    create_index = _write_locked(PatientRecordSystem.create_index)
+    create_text_index = _write_locked(PatientRecordSystem.create_text_index)
+    add_patients = _write_locked(PatientRecordSystem.add_patients)
+    update_many = _write_locked(PatientRecordSystem.update_many)
+    delete_patients = _write_locked(PatientRecordSystem.delete_patients)
+    get_page = _read_locked(PatientRecordSystem.get_page)
+    search_text = _read_locked(PatientRecordSystem.search_text)
+
+
+def _sorted_order(rows):
+    # Process-pool task of ShardedPatientRecordSystem: the stable sorting permutation of one shard's sort keys
+    return array('q', sorted(range(len(rows)), key=rows.__getitem__))
+
+
+def _date_range_matches(values, id_keys, start, end):
+    # Process-pool task of ShardedPatientRecordSystem: the positions of one shard's date values between
+    # start and end (inclusive), ordered by date and then patient ID like a SortedIndex
+    low, high = date_key(start), date_key(end)
+    keys = [date_key(value) for value in values]
+    matches = [index for index, key in enumerate(keys) if low <= key <= high]
+    matches.sort(key=lambda index: (keys[index], id_keys[index]))
+    return array('q', matches)
+
+
+class ShardedPatientRecordSystem:
+    """
+    Patient records split over several PatientRecordSystem shards, by ID hash or by ID range.
+    It offers the same add, search, update and delete methods as one PatientRecordSystem. Re-sorts and
+    date range scans run one task per shard in a pool of worker processes, which receive only the sort
+    keys or the scanned column and return positions; ordered results are k-way merged across the shards.
+    Use it as a context manager, or call close(), to shut the worker processes down.
+    """
+
+    # Constructor
+    def __init__(self, shard_count=4, partition='hash', range_size=100000, processes=None, shard_capacity=1000):
+        if partition not in ('hash', 'range'):
+            raise ValueError(f"partition must be 'hash' or 'range', not {partition!r}")
+        self.shards = [PatientRecordSystem(max_patients=shard_capacity, growable=True) for _ in range(shard_count)]
+        self.partition = partition  # 'hash' spreads consecutive IDs evenly, 'range' keeps ID ranges together
+        self.range_size = range_size  # IDs per shard with range partitioning, the last shard takes the rest
+        self.processes = processes or os.cpu_count() or 1  # worker processes, 1 runs every task in this process
+        self._pool = None  # ProcessPoolExecutor, started on first use
+        self._sort_key = 'Patient_id'  # the field(s) the shards are currently ordered on
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Shut the worker processes down."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _map(self, task, *arguments):
+        # Run task once per shard, in the worker processes when there is more than one
+        if self.processes == 1:
+            return list(map(task, *arguments))
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(max_workers=self.processes)
+        return list(self._pool.map(task, *arguments))
+
+    def shard_index(self, patient_id):
+        """Return the position in shards of the shard that holds (or would hold) patient_id."""
+        number = patient_id_key(patient_id)[1]
+        if number < 0:
+            number = sum(map(ord, patient_id))  # IDs without a number are spread by their characters
+        if self.partition == 'range':
+            return min(number // self.range_size, len(self.shards) - 1)
+        return number % len(self.shards)
+
+    def shard_for(self, patient_id):
+        return self.shards[self.shard_index(patient_id)]
+
+    def add_patient(self, patient):
+        self.shard_for(patient.get_patient_id()).add_patient(patient)
+
+    def search_patient(self, patient_id):
+        return self.shard_for(patient_id).search_patient(patient_id)
+
+    def binary_search_patient(self, patient_id):
+        return self.shard_for(patient_id).binary_search_patient(patient_id)
+
+    def update_patient(self, patient_id, name=None, date_of_birth=None, medical_history=None, phone=None,
+                       admission_date=None):
+        self.shard_for(patient_id).update_patient(patient_id, name, date_of_birth, medical_history, phone,
+                                                  admission_date)
+
+    def delete_patient(self, patient_id):
+        self.shard_for(patient_id).delete_patient(patient_id)
+
+    def _scatter(self, method, items, patient_id_of):
+        # Hand each shard its part of a batch in one call of method, and return the per-item results in input order
+        by_shard = [[] for _ in self.shards]
+        positions = [[] for _ in self.shards]
+        for position, item in enumerate(items):
+            shard_index = self.shard_index(patient_id_of(item))
+            by_shard[shard_index].append(item)
+            positions[shard_index].append(position)
+        results = [None] * sum(map(len, positions))
+        for shard, shard_items, shard_positions in zip(self.shards, by_shard, positions):
+            if shard_items:
+                for position, result in zip(shard_positions, getattr(shard, method)(shard_items)):
+                    results[position] = result
+        return results
+
+    def add_patients(self, patients):
+        return self._scatter('add_patients', patients, Patient.get_patient_id)
+
+    def update_many(self, updates):
+        return self._scatter('update_many', updates, itemgetter(0))
+
+    def delete_patients(self, patient_ids):
+        return self._scatter('delete_patients', patient_ids, lambda patient_id: patient_id)
+
+    def search_patients(self, patient_ids):
+        """Look up many patients at once and return the ones found, ordered by patient ID."""
+        by_shard = [[] for _ in self.shards]
+        for patient_id in patient_ids:
+            by_shard[self.shard_index(patient_id)].append(patient_id)
+        shard_results = []
+        for shard, shard_ids in zip(self.shards, by_shard):
+            found = [shard.binary_search_patient(patient_id) for patient_id in sorted(shard_ids, key=patient_id_key)]
+            shard_results.append([patient for patient in found if patient is not None])
+        return list(heapq.merge(*shard_results, key=lambda patient: patient_id_key(patient.get_patient_id())))
+
+    def __len__(self):
+        return sum(map(len, self.shards))
+
+    def get_page(self, page_size, after=None):
+        """Return up to page_size patients in patient ID order after the patient ID after, merged across the shards."""
+        pages = [shard.get_page(page_size, after) for shard in self.shards]
+        merged = heapq.merge(*pages, key=lambda patient: patient_id_key(patient.get_patient_id()))
+        return list(islice(merged, page_size))
+
+    def cursor(self, after=None, page_size=100):
+        return PatientCursor(self, after, page_size)
+
+    def _live_records(self, shard):
+        # The filled records of a shard and their ID keys, after closing any deleted slots
+        shard.compact()
+        return shard.records[:shard.next_index], shard._id_keys
+
+    def sort_patient_records(self, sort_key):
+        """Sort every shard on sort_key (a field name or a tuple of field names), one shard per worker process."""
+        fields = [sort_key] if isinstance(sort_key, str) else list(sort_key)
+        fields = [field.lower().lstrip('_') for field in fields]
+        for field in fields:
+            getattr(Patient, f'get_{field}')  # unknown fields fail here, as in PatientRecordSystem
+        live = [self._live_records(shard) for shard in self.shards]
+        rows = []
+        for records, id_keys in live:
+            # The ID keys are already known; other fields are read straight from the Patient slots
+            columns = [id_keys if field == 'patient_id'
+                       else list(map(date_key, map(attrgetter('_' + field), records))) if field in Patient.DATE_FIELDS
+                       else list(map(attrgetter('_' + field), records))
+                       for field in fields]
+            rows.append(columns[0] if len(columns) == 1 else list(zip(*columns)))
+        for shard, (records, id_keys), order in zip(self.shards, live, self._map(_sorted_order, rows)):
+            shard._load_sorted([records[index] for index in order], sort_key, [id_keys[index] for index in order])
+        self._sort_key = sort_key
+
+    def __iter__(self):
+        """Iterate over all patients in the current sort order, merging the shards."""
+        return heapq.merge(*(self._live_records(shard)[0] for shard in self.shards),
+                           key=Patient.sort_key_function(self._sort_key))
+
+    def find_patients_in_range(self, field, start, end):
+        """
+        Return the patients whose date field is between start and end (inclusive), ordered by that date.
+        Unlike PatientRecordSystem, no index is needed: every shard is scanned by a worker process.
+        """
+        getter_slot = attrgetter('_' + field.lower().lstrip('_'))
+        live = [self._live_records(shard) for shard in self.shards]
+        columns = [list(map(getter_slot, records)) for records, id_keys in live]
+        matches = self._map(_date_range_matches, columns, [id_keys for records, id_keys in live],
+                            [start] * len(live), [end] * len(live))
+        shard_results = [[records[index] for index in positions]
+                         for (records, id_keys), positions in zip(live, matches)]
+        return list(heapq.merge(*shard_results, key=lambda patient: (date_key(getter_slot(patient)),
+                                                                      patient_id_key(patient.get_patient_id()))))
+
+
+class DictionaryColumn:
+    """Column of repeated strings stored as integer codes into a list of distinct values"""
+
+    # Constructor
+    def __init__(self):
+        self._codes = array('I')  # one code per row
+        self._values = []  # distinct values, indexed by code
+        self._lookup = {}  # maps value to its code
+
+    def __len__(self):
+        return len(self._codes)
+
+    def append(self, value):
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self._values)
+            self._values.append(value)
+        self._codes.append(code)
+
+    def get_value(self, row):
+        return self._values[self._codes[row]]
+
+    def get_code(self, value):
+        return self._lookup.get(value)
+
+    def get_codes(self):
+        return self._codes
+
+    def get_values(self):
+        return self._values
+
+
+class ColumnarPatientStore:
+    """
+    Struct-of-arrays copy of the patient records for bulk analytics.
+    Dates are stored as YYYYMMDD integers and repeated strings are dictionary-encoded.
+    Filters and counts run on NumPy views of the columns when NumPy is installed.
+    The original date texts and patient IDs are kept as well, so to_patient returns them unchanged
+    ('2024-1-5' stays '2024-1-5', a free-form date is not lost).
+    """
+    DICTIONARY_COLUMNS = ('id_prefix', 'name', 'medical_history', 'date_of_birth_text', 'admission_date_text')
+    DATE_COLUMNS = ('date_of_birth', 'admission_date')
+
+    # Constructor
+    def __init__(self):
+        self._columns = {name: DictionaryColumn() for name in self.DICTIONARY_COLUMNS}
+        self._columns['id_number'] = array('q')
+        self._columns['date_of_birth'] = array('l')
+        self._columns['admission_date'] = array('l')
+        self._phones = []  # phone numbers are nearly unique, so they are not dictionary-encoded
+        self._patient_ids = []  # the exact IDs, as id_prefix and id_number lose leading zeros such as in HP007
+
+    def __len__(self):
+        return len(self._phones)
+
+    @classmethod
+    def from_record_system(cls, record_system):
+        """Build a columnar store from the live records of a PatientRecordSystem."""
+        store = cls()
+        store.sync(record_system)
+        return store
+
+    def sync(self, record_system):
+        """Replace the store's rows with the live records of a PatientRecordSystem, in ID order."""
+        self.__init__()
+        for patient in record_system.records[:record_system.next_index]:
+            if patient is not None:
+                self.append(patient)
+
+    def append(self, patient):
+        """Append one patient as a new row."""
+        prefix, number = patient_id_key(patient.get_patient_id())
+        columns = self._columns
+        columns['id_prefix'].append(prefix)
+        columns['id_number'].append(number)
+        columns['name'].append(patient.get_name())
+        columns['medical_history'].append(patient.get_medical_history())
+        columns['date_of_birth'].append(date_key(patient.get_date_of_birth()))
+        columns['admission_date'].append(date_key(patient.get_admission_date()))
+        columns['date_of_birth_text'].append(patient.get_date_of_birth())
+        columns['admission_date_text'].append(patient.get_admission_date())
+        self._phones.append(patient.get_phone())
+        self._patient_ids.append(patient.get_patient_id())
+
+    def to_patient(self, row):
+        """Turn one row back into a Patient object with the same patient ID."""
+        columns = self._columns
+        return Patient(columns['name'].get_value(row),
+                       columns['date_of_birth_text'].get_value(row),
+                       columns['medical_history'].get_value(row),
+                       self._phones[row],
+                       columns['admission_date_text'].get_value(row),
+                       patient_id=self._patient_ids[row])
+
+    def _numeric_column(self, column):
+        # Return the integer values of a column, plus a divisor for the derived *_year columns
+        if column.endswith('_year'):
+            return self._columns[column[:-len('_year')]], 10000
+        data = self._columns[column]
+        if isinstance(data, DictionaryColumn):
+            return data.get_codes(), 1
+        return data, 1
+
+    def _condition_bounds(self, column, condition):
+        # Translate an exact value or an inclusive (low, high) range into integer bounds on the stored column
+        data = self._columns.get(column)
+        if isinstance(data, DictionaryColumn):
+            code = data.get_code(condition)
+            return (-1, -1) if code is None else (code, code)
+        if isinstance(condition, tuple):
+            low, high = condition
+        else:
+            low = high = condition
+        if column in self.DATE_COLUMNS:
+            low, high = date_key(low), date_key(high)
+        return low, high
+
+    def filter(self, **conditions):
+        """
+        Return the row numbers matching every condition, e.g.
+        filter(medical_history=..., admission_date=('2022-1-1', '2022-12-31'), birth_year=1990).
+        Dictionary columns take an exact value, the other columns a value or an inclusive (low, high) range.
+        """
+        np = _load_numpy()
+        rows = None
+        for column, condition in conditions.items():
+            if column == 'birth_year':
+                column = 'date_of_birth_year'
+            values, divisor = self._numeric_column(column)
+            low, high = self._condition_bounds(column, condition)
+            if np is not None:
+                view = np.frombuffer(values, dtype=values.typecode) if len(values) else np.empty(0, dtype=np.int64)
+                if divisor != 1:
+                    view = view // divisor
+                mask = (view >= low) & (view <= high)
+                rows = mask if rows is None else rows & mask
+                del view
+            else:
+                if divisor != 1:
+                    matches = {i for i, value in enumerate(values) if low <= value // divisor <= high}
+                else:
+                    matches = {i for i, value in enumerate(values) if low <= value <= high}
+                rows = matches if rows is None else rows & matches
+        if rows is None:
+            return list(range(len(self)))
+        if np is not None:
+            return np.flatnonzero(rows).tolist()
+        return sorted(rows)
+
+    def count(self, **conditions):
+        """Return the number of rows matching every condition (see filter)."""
+        if not conditions:
+            return len(self)
+        return len(self.filter(**conditions))
+
+    def group_by_count(self, column, rows=None):
+        """
+        Return a dictionary mapping each value of the column to its number of rows, e.g.
+        group_by_count('admission_date_year') or group_by_count('medical_history').
+        rows limits the count to the given row numbers, such as the result of filter.
+        """
+        np = _load_numpy()
+        values, divisor = self._numeric_column(column)
+        data = self._columns.get(column)
+        if np is not None and len(values):
+            view = np.frombuffer(values, dtype=values.typecode)
+            if rows is not None:
+                view = view[np.asarray(rows, dtype=np.int64)]
+            if divisor != 1:
+                view = view // divisor
+            keys, counts = np.unique(view, return_counts=True)
+            grouped = dict(zip(keys.tolist(), counts.tolist()))
+            del view
+        else:
+            grouped = defaultdict(int)
+            selected = values if rows is None else (values[row] for row in rows)
+            for value in selected:
+                grouped[value // divisor] += 1
+        if isinstance(data, DictionaryColumn):
+            labels = data.get_values()
+            return {labels[code]: total for code, total in grouped.items()}
+        return dict(grouped)
+
+
 class Appointment:
     """Class that represents the appointments"""
-    appointment_count = 0
+    __slots__ = ('_appointment_id', '_patient', '_doctor', '_date', '_time', '_reason', '_patient_id', '_doctor_id',
+                 '_duration', '_start')
+    id_allocator = IdAllocator("HAp")
+    appointment_count = IdCount()  # Number of the last ID handed out
 
     # Constructor
-    def __init__(self, patient, doctor, date, time, reason):
-        Appointment.appointment_count +=1
-        self._appointment_id = f"HAp{Appointment.appointment_count}"  # Generate appointment ID automatically
-        self._patient = patient  # Reference to Patient object
-        self._doctor = doctor    # Reference to Doctor object
+    def __init__(self, patient, doctor, date, time, reason, duration=30):
+        if not duration > 0:
+            # A zero or negative length would let bookings share a start and break the scheduler's ordering
+            raise ValueError(f"Appointment duration must be positive, not {duration!r}")
+        self._appointment_id = Appointment.id_allocator.next_id()  # Generate appointment ID automatically
+        self._patient = patient  # Reference to Patient object (or the patient ID when created from the menu)
+        self._doctor = doctor    # Reference to Doctor object (or the doctor ID when created from the menu)
+        self._patient_id = patient.get_patient_id() if isinstance(patient, Patient) else patient
+        self._doctor_id = doctor.get_doctor_id() if isinstance(doctor, Doctor) else doctor
         self._date = date
         self._time = time
         self._reason = reason
+        self._duration = duration  # length of the appointment in minutes
+        self._start = appointment_minutes(date, time)  # parsed once, None if date or time is free-form text
 
 
     # Setters and Getters
     def get_appointment_id(self):
         return self._appointment_id
 
+    def get_patient(self):
+        return self._patient
+
+    def get_doctor(self):
+        return self._doctor
+
     def set_patient_id(self, value):
-        self._patient_id = value
+        old_patient_id, self._patient_id = self._patient_id, value
+        if _patient_listeners:
+            _patient_changed(old_patient_id, 'appointments')
+            _patient_changed(value, 'appointments')
 
     def get_patient_id(self):
         return self._patient_id
 
     def set_doctor_id(self, value):
         self._doctor_id = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'appointments')
 
     def get_doctor_id(self):
         return self._doctor_id
 
     def set_date(self, value):
-        self._date = value
+        """Move the appointment to another date, returns False if that overlaps another appointment of the doctor."""
+        return self._move(value, self._time)
 
     def get_date(self):
         return self._date
 
     def set_time(self, value):
-        self._time = value
+        """Move the appointment to another time, returns False if that overlaps another appointment of the doctor."""
+        return self._move(self._date, value)
+
+    def _move(self, date, time_of_day):
+        # A doctor the appointment is scheduled with has to move it in its schedule, after a conflict check
+        doctor = self._doctor if isinstance(self._doctor, Doctor) else Doctor.doctors.get(self._doctor_id)
+        if doctor is not None and doctor.is_scheduled(self):
+            return doctor.reschedule_appointment(self, date, time_of_day)
+        self._set_slot(date, time_of_day)
+        return True
+
+    def _set_slot(self, date, time_of_day):
+        # Change the date and time, without any schedule bookkeeping (see Doctor.reschedule_appointment)
+        self._date = date
+        self._time = time_of_day
+        self._start = appointment_minutes(date, time_of_day)
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'appointments')
 
     def get_time(self):
         return self._time
 
+    def get_duration(self):
+        return self._duration
+
+    def get_start(self):
+        return self._start
+
+    def get_end(self):
+        return None if self._start is None else self._start + self._duration
+
     def set_reason(self, value):
         self._reason = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'appointments')
 
     def get_reason(self):
         return self._reason
@@ -427,12 +2164,13 @@ class Appointment:
 
 class Prescription:
     """Class that represents the prescriptions"""
-    prescription_count = 0
+    __slots__ = ('_prescription_id', '_patient_id', '_doctor_id', '_medication', '_dosage', '_duration')
+    id_allocator = IdAllocator("HPr")
+    prescription_count = IdCount()  # Number of the last ID handed out
 
     # Constructor
     def __init__(self, patient_id, doctor_id, medication, dosage, duration):
-        Prescription.prescription_count +=1
-        self._prescription_id = f"HPr{Prescription.prescription_count}"  # Generate prescription ID automatically
+        self._prescription_id = Prescription.id_allocator.next_id()  # Generate prescription ID automatically
         self._patient_id = patient_id  # ID of the patient to whom the prescription is issued
         self._doctor_id = doctor_id  # ID of the doctor who issued the prescription
         self._medication = medication  # Name of the prescription
@@ -457,18 +2195,24 @@ class Prescription:
 
     def set_medication(self, value):
         self._medication = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'prescriptions')
 
     def get_medication(self):
         return self._medication
 
     def set_dosage(self, value):
         self._dosage = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'prescriptions')
 
     def get_dosage(self):
         return self._dosage
 
     def set_duration(self, value):
         self._duration = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'prescriptions')
 
     def get_duration(self):
         return self._duration
@@ -476,13 +2220,14 @@ class Prescription:
 
 class Record:
     """Class that represents the records"""
-    record_count = 0
+    __slots__ = ('_patient_id', '_record_id', '_diagnosis', '_treatment_plan')
+    id_allocator = IdAllocator("HR")
+    record_count = IdCount()  # Number of the last ID handed out
 
     # Constructor
     def __init__(self, patient_id, diagnosis, treatment_plan):
-        Record.record_count += 1
         self._patient_id = patient_id  # ID of the patient to whom the record belongs
-        self._record_id = f"HR{Record.record_count}"  # identifier for the record
+        self._record_id = Record.id_allocator.next_id()  # identifier for the record
         self._diagnosis = diagnosis  # Diagnosis information
         self._treatment_plan = treatment_plan  # Proposed treatment plan
 
@@ -498,12 +2243,16 @@ class Record:
 
     def set_diagnosis(self, value):
         self._diagnosis = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'record')
 
     def get_diagnosis(self):
         return self._diagnosis
 
     def set_treatment_plan(self, value):
         self._treatment_plan = value
+        if _patient_listeners:
+            _patient_changed(self._patient_id, 'record')
 
     def get_treatment_plan(self):
         return self._treatment_plan
@@ -511,6 +2260,7 @@ class Record:
 
 class Node:
     """Class that represent nodes for singly linked lists"""
+    __slots__ = ('_patient', '_next')
 
     # Constructor
     def __init__(self, patient):
@@ -538,6 +2288,21 @@ class SinglyLinkedList:
     def __init__(self):
         self._head = None  # the head of the list, starting as None
         self._tail = None  # the tail of the list, also starting as None
+        self._size = 0  # number of nodes, kept up to date so len() is O(1)
+
+    def __len__(self):
+        return self._size
+
+    # Forward iteration from head to tail, in dequeue order, one node at a time without building a list
+    def __iter__(self):
+        node = self._head
+        while node is not None:
+            yield node.get_patient()
+            node = node.get_next()
+
+    # Reverse iteration from tail to head; the nodes have no back links, so the patients are collected first
+    def __reversed__(self):
+        return reversed(list(self))
 
     # Setters and Getters
     def set_head(self, node):
@@ -560,12 +2325,14 @@ class SinglyLinkedList:
         else:
             self._tail.set_next(new_node)  # Link the current tail to the new node
             self._tail = new_node  # Update the tail to be the new node
+        self._size += 1
 
     # a method to remove and return a patient from the front of the list
     def dequeue(self):
         if self._head:  # If the list is not empty
             removed_patient = self._head.get_patient()  # storing the patient to return
             self._head = self._head.get_next()  # moving the head to the next node
+            self._size -= 1
             if self._head is None:  # If removing the node made the list empty
                 self._tail = None  # tail to None since the list is empty
             return removed_patient  # Returning the removed patient
@@ -574,6 +2341,7 @@ class SinglyLinkedList:
 
 class DNode:
     """Class that represents nodes for a doubly linked list"""
+    __slots__ = ('patient', '_prev', '_next')
 
     # Constructor
     def __init__(self, patient):
@@ -608,6 +2376,24 @@ class DoublyLinkedList:
     def __init__(self):
         self._head = None  # the head of the list, starting as None
         self._tail = None  # the tail of the list, also starting as None
+        self._size = 0  # number of nodes, kept up to date so len() is O(1)
+
+    def __len__(self):
+        return self._size
+
+    # Forward iteration from head to tail, in pop order, one node at a time without building a list
+    def __iter__(self):
+        node = self._head
+        while node is not None:
+            yield node.get_patient()
+            node = node.get_next()
+
+    # Reverse iteration from tail to head, one node at a time without building a list
+    def __reversed__(self):
+        node = self._tail
+        while node is not None:
+            yield node.get_patient()
+            node = node.get_prev()
 
     # Setters and Getters
     def set_head(self, node):
@@ -631,12 +2417,14 @@ class DoublyLinkedList:
             self._tail.set_next(new_node)  # Link the current tail to the new node
             new_node.set_prev(self._tail)  # Link the new node back to the current tail
             self._tail = new_node  # Update the tail to be the new node
+        self._size += 1
 
     # Method to remove and return a patient from the front of the list
     def pop(self):
         if self._head:  # If the list is not empty
             removed_patient = self._head.get_patient()  # Store the patient to return
             self._head = self._head.get_next()  # Move the head to the next node
+            self._size -= 1
             if self._head is None:  # If removing the node made the list empty
                 self._tail = None  # Set tail to None since the list is empty
             else:
@@ -644,6 +2432,103 @@ class DoublyLinkedList:
             return removed_patient  # Return the removed patient
         return None  # If the list was empty, return None
 
+class IndexedDoublyLinkedList(DoublyLinkedList):
+    """Doubly linked list that also maps patient_id to its node, for O(1) removal and reordering"""
+
+    # Constructor
+    def __init__(self):
+        super().__init__()
+        self._nodes = {}  # maps patient_id to the DNode holding that patient
+
+    def __contains__(self, patient_id):
+        return patient_id in self._nodes
+
+    def get_node(self, patient_id):
+        return self._nodes.get(patient_id)
+
+    def _unlink(self, node):
+        # Detach the node from its neighbours, updating head and tail when needed
+        prev_node, next_node = node.get_prev(), node.get_next()
+        if prev_node is None:
+            self._head = next_node
+        else:
+            prev_node.set_next(next_node)
+        if next_node is None:
+            self._tail = prev_node
+        else:
+            next_node.set_prev(prev_node)
+        node.set_prev(None)
+        node.set_next(None)
+        self._size -= 1
+
+    def _link_after(self, node, prev_node):
+        # Link a detached node right after prev_node, or at the front when prev_node is None
+        next_node = self._head if prev_node is None else prev_node.get_next()
+        node.set_prev(prev_node)
+        node.set_next(next_node)
+        if prev_node is None:
+            self._head = node
+        else:
+            prev_node.set_next(node)
+        if next_node is None:
+            self._tail = node
+        else:
+            next_node.set_prev(node)
+        self._size += 1
+
+    # Method to add a patient to the end of the list
+    def append(self, patient):
+        patient_id = patient.get_patient_id()
+        if patient_id in self._nodes:
+            print(f"Patient {patient_id} is already in the list.")
+            return
+        new_node = DNode(patient)
+        self._link_after(new_node, self._tail)
+        self._nodes[patient_id] = new_node
+
+    # Method to remove and return a patient from the front of the list
+    def pop(self):
+        removed_patient = super().pop()
+        if removed_patient is not None:
+            del self._nodes[removed_patient.get_patient_id()]
+        return removed_patient
+
+    # Method to remove a patient from anywhere in the list in O(1)
+    def remove(self, patient_id):
+        """Remove the patient with the given ID and return it, or None if the patient is not in the list."""
+        node = self._nodes.pop(patient_id, None)
+        if node is None:
+            return None
+        self._unlink(node)
+        return node.get_patient()
+
+    # Method to move a patient to the front of the list in O(1)
+    def move_to_front(self, patient_id):
+        """Move the patient with the given ID to the head of the list. Returns False if the patient is not in the list."""
+        node = self._nodes.get(patient_id)
+        if node is None:
+            return False
+        if node is not self._head:
+            self._unlink(node)
+            self._link_after(node, None)
+        return True
+
+    # Method to insert a new patient right after an existing one in O(1)
+    def insert_after(self, patient_id, patient):
+        """Insert patient right after the patient with the given ID. Returns False if that patient is not in the list."""
+        prev_node = self._nodes.get(patient_id)
+        if prev_node is None:
+            return False
+        new_patient_id = patient.get_patient_id()
+        if new_patient_id in self._nodes:
+            print(f"Patient {new_patient_id} is already in the list.")
+            return False
+        new_node = DNode(patient)
+        self._link_after(new_node, prev_node)
+        self._nodes[new_patient_id] = new_node
+        return True
+
+
 class Stack:
     """Stack class for managing prescriptions in a LIFO (Last-In-First-Out)"""
 
@@ -656,7 +2541,19 @@ class Stack:
         self._items = items
 
     def get_items(self):
-        return self._items
+        """Get a read-only view of the prescriptions, bottom of the stack first."""
+        return ReadOnlyView(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    # Iteration from the top of the stack down, in pop order, without copying the items
+    def __iter__(self):
+        return reversed(self._items)
+
+    # Iteration from the bottom of the stack up, in push order
+    def __reversed__(self):
+        return iter(self._items)
 
     # Method to check if the stack is empty
     def is_empty(self):
@@ -691,70 +2588,1034 @@ class Stack:
         return None
 
 
+class ReadOnlyView:
+    """Read-only view over the items of a data structure, nothing is copied"""
+
+    # Constructor
+    def __init__(self, items):
+        self._items = items  # the underlying list or deque, never modified through the view
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __reversed__(self):
+        return reversed(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __bool__(self):
+        return len(self._items) > 0
+
+    def __repr__(self):
+        return f"ReadOnlyView({list(self._items)!r})"
+
+
 class Queue:
     """Queue class specifically designed for managing the scheduling of appointments in a FIFO manner"""
 
     # Constructor
     def __init__(self):
-        self._appointments = []  # Internal list that acts as the queue for storing appointments
+        self._appointments = deque()  # Internal ring buffer that acts as the queue for storing appointments
 
     # Setters and Getters
     def set_appointments(self, appointments):
-        """Set the appointments list."""
-        self._appointments = appointments
+        """Set the appointments, in queue order."""
+        self._appointments = deque(appointments)
 
     def get_appointments(self):
-        """Get the appointments list."""
-        return self._appointments
+        """Get a read-only view of the appointments, front of the queue first."""
+        return ReadOnlyView(self._appointments)
+
+    def __len__(self):
+        return len(self._appointments)
+
+    # Iteration from the front of the queue, in dequeue order, without copying the appointments
+    def __iter__(self):
+        return iter(self._appointments)
+
+    # Iteration from the rear of the queue
+    def __reversed__(self):
+        return reversed(self._appointments)
 
     # Method to check if the queue is empty
     def is_empty(self):
         """Check if the queue is empty."""
         # Returns True if the queue is empty, indicating no appointments are queued
-        # This is determined by checking if the length of the appointments list is 0
+        # This is determined by checking if the length of the appointments buffer is 0
         return len(self._appointments) == 0
 
     # Method to add an appointment to the end (rear) of the queue
     def enqueue(self, appointment):
         """Add an appointment to the end (rear) of the queue."""
-        # Appending the given appointment object to the end of the appointments list
+        # Appending the given appointment object to the right end of the buffer in O(1)
         # This represents adding an appointment to the rear of the queue
         self._appointments.append(appointment)
 
+    # Method to add a block of appointments to the rear of the queue in one step
+    def enqueue_many(self, appointments):
+        """Add every appointment of the iterable to the rear of the queue, keeping their order."""
+        self._appointments.extend(appointments)
+
     # Method to remove and return the first (front) appointment from the queue
     def dequeue(self):
         """Remove and return the first (front) appointment from the queue."""
         # Check if the queue is not empty to ensure an appointment can be dequeued
         if not self.is_empty():
-            # Removing and returning the first appointment in the list
+            # Removing and returning the first appointment from the left end of the buffer in O(1)
             # This represents removing the appointment from the front of the queue
-            return self._appointments.pop(0)
+            return self._appointments.popleft()
         # If the queue is empty, return None to indicate there are no appointments to dequeue
         return None
 
+    # Method to remove a block of appointments from the front of the queue in one step
+    def dequeue_many(self, k):
+        """Remove and return up to k appointments from the front of the queue, in queue order."""
+        popleft = self._appointments.popleft
+        return [popleft() for _ in range(min(k, len(self._appointments)))]
+
     # Method to view the first (front) appointment in the queue without removing it
     def peek(self):
         """View the first (front) appointment in the queue without removing it."""
         # Check if the queue is not empty to ensure there is an appointment to peek at
         if not self.is_empty():
-            # Return the first appointment in the list without removing it
+            # Return the first appointment in the buffer without removing it
             # This allows viewing the front appointment in the queue
             return self._appointments[0]
         # If the queue is empty, return None to indicate there's no appointment to peek at
         return None
 
 
-consultation_queue = Queue()
+class BlockingQueue(Queue):
+    """
+    Thread-safe Queue for producer and consumer threads.
+    enqueue waits while the queue holds maxsize appointments (0 means unbounded) and dequeue waits while
+    it is empty, either without limit, for at most timeout seconds, or not at all with block=False.
+    """
+
+    # Constructor
+    def __init__(self, maxsize=0):
+        super().__init__()
+        self.maxsize = maxsize
+        self._mutex = threading.Lock()
+        self._not_empty = threading.Condition(self._mutex)  # notified when an appointment is added
+        self._not_full = threading.Condition(self._mutex)  # notified when an appointment is removed
+
+    def set_appointments(self, appointments):
+        """Set the appointments, in queue order."""
+        with self._mutex:
+            self._appointments = deque(appointments)
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def get_appointments(self):
+        """Get a read-only copy of the appointments, front of the queue first."""
+        with self._mutex:
+            return ReadOnlyView(list(self._appointments))  # a copy, as other threads keep changing the queue
+
+    # Iteration over a copy taken under the lock, as a deque cannot be iterated while another thread changes it
+    def __iter__(self):
+        return iter(self.get_appointments())
+
+    def __reversed__(self):
+        return reversed(self.get_appointments())
+
+    # Method to add an appointment to the rear of the queue, waiting for room if the queue is full
+    def enqueue(self, appointment, block=True, timeout=None):
+        """Add an appointment to the rear of the queue. Returns False if no room was freed in time."""
+        with self._not_full:
+            if self.maxsize and not self._not_full.wait_for(lambda: len(self._appointments) < self.maxsize,
+                                                            timeout if block else 0):
+                return False
+            self._appointments.append(appointment)
+            self._not_empty.notify()
+            return True
+
+    # Method to add a block of appointments, waiting for room as needed
+    def enqueue_many(self, appointments, block=True, timeout=None):
+        """
+        Add the appointments to the rear of the queue, keeping their order.
+        Returns the number added, which is smaller than requested if no room was freed in time.
+        """
+        added = 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for appointment in appointments:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not self.enqueue(appointment, block, remaining):
+                break
+            added += 1
+        return added
+
+    # Method to remove the front appointment, waiting for one if the queue is empty
+    def dequeue(self, block=True, timeout=None):
+        """Remove and return the front appointment, or None if none arrived in time."""
+        with self._not_empty:
+            if not self._not_empty.wait_for(lambda: self._appointments, timeout if block else 0):
+                return None
+            appointment = self._appointments.popleft()
+            self._not_full.notify()
+            return appointment
+
+    # Method to remove a block of appointments from the front of the queue in one step
+    def dequeue_many(self, k):
+        """Remove and return up to k appointments from the front of the queue without waiting."""
+        with self._mutex:
+            appointments = super().dequeue_many(k)
+            self._not_full.notify(len(appointments))
+            return appointments
+
+    def peek(self):
+        """View the front appointment without removing it."""
+        with self._mutex:
+            return self._appointments[0] if self._appointments else None
+
+
+class TriageQueue:
+    """
+    Priority queue for triaging patients, backed by a binary heap.
+    Lower priority values are seen first (see TriageLevel). Waiting patients age: their effective
+    priority drops by aging_rate levels per second of waiting, so low-priority patients cannot starve.
+    """
+
+    # Constructor
+    def __init__(self, aging_rate=1 / 600, clock=time.monotonic):
+        self._heap = []  # heap of [order key, sequence number, patient_id, patient, priority, enqueue time]
+        self._entries = {}  # maps patient_id to its live heap entry
+        self._counter = 0  # sequence number that keeps equal keys in arrival order
+        self.aging_rate = aging_rate  # priority levels gained per second of waiting
+        self._clock = clock  # time source, injectable for simulations
+
+    def _order_key(self, priority, enqueue_time):
+        # Aging lowers every waiting patient's priority at the same rate, so ordering by
+        # priority + aging_rate * enqueue_time gives the same order as the aged priority at any instant
+        return priority + self.aging_rate * enqueue_time
+
+    # Method to check if the queue is empty
+    def is_empty(self):
+        """Check if the queue is empty."""
+        return len(self._entries) == 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, patient_id):
+        return patient_id in self._entries
+
+    # Method to add a patient with a priority in O(log n)
+    def enqueue(self, patient, priority=TriageLevel.STANDARD):
+        """Add a patient with the given priority (a TriageLevel or a number)."""
+        patient_id = patient.get_patient_id()
+        if patient_id in self._entries:
+            print(f"Patient {patient_id} is already waiting in the triage queue.")
+            return
+        if isinstance(priority, TriageLevel):
+            priority = priority.value
+        enqueue_time = self._clock()
+        self._counter += 1
+        entry = [self._order_key(priority, enqueue_time), self._counter, patient_id, patient, priority, enqueue_time]
+        self._entries[patient_id] = entry
+        heapq.heappush(self._heap, entry)
+
+    # Method to change the priority of a waiting patient in O(log n)
+    def change_priority(self, patient_id, priority):
+        """Change the priority of a waiting patient, keeping the time already waited. Returns False if not waiting."""
+        entry = self._entries.get(patient_id)
+        if entry is None:
+            return False
+        if isinstance(priority, TriageLevel):
+            priority = priority.value
+        enqueue_time = entry[5]
+        self._counter += 1
+        new_entry = [self._order_key(priority, enqueue_time), self._counter, patient_id, entry[3], priority, enqueue_time]
+        # The old entry is left in the heap marked as removed and skipped when it reaches the top
+        entry[3] = None
+        self._entries[patient_id] = new_entry
+        heapq.heappush(self._heap, new_entry)
+        self._drop_stale_entries()
+        return True
+
+    # Method to remove a waiting patient, e.g. one who left, in O(log n)
+    def remove(self, patient_id):
+        """Remove a waiting patient and return it, or None if the patient is not waiting."""
+        entry = self._entries.pop(patient_id, None)
+        if entry is None:
+            return None
+        patient = entry[3]
+        entry[3] = None  # marked as removed, skipped when it reaches the top of the heap
+        self._drop_stale_entries()
+        return patient
+
+    def _drop_stale_entries(self):
+        # Rebuild the heap without the marked entries once they make up more than half of it, so heavy
+        # re-prioritizing cannot grow it without bound; each rebuild is paid for by the changes before it
+        if len(self._heap) > 2 * len(self._entries):
+            self._heap = [entry for entry in self._heap if entry[3] is not None]
+            heapq.heapify(self._heap)
+
+    def _discard_removed(self):
+        # Pop entries of removed or re-prioritized patients off the top of the heap
+        heap = self._heap
+        while heap and heap[0][3] is None:
+            heapq.heappop(heap)
+
+    # Method to remove and return the most urgent patient in O(log n)
+    def dequeue(self):
+        """Remove and return the patient with the lowest aged priority."""
+        self._discard_removed()
+        if not self._heap:
+            return None
+        entry = heapq.heappop(self._heap)
+        del self._entries[entry[2]]
+        return entry[3]
+
+    # Method to view the most urgent patient without removing it
+    def peek(self):
+        """View the patient with the lowest aged priority without removing it."""
+        self._discard_removed()
+        if not self._heap:
+            return None
+        return self._heap[0][3]
+
+    def get_effective_priority(self, patient_id):
+        """Return the aged priority of a waiting patient, or None if the patient is not waiting."""
+        entry = self._entries.get(patient_id)
+        if entry is None:
+            return None
+        return entry[4] - self.aging_rate * (self._clock() - entry[5])
+
+
+class AsyncConsultationQueue:
+    """
+    Consultation queue for asyncio code, with room for at most maxsize waiting patients (0 means unbounded).
+    enqueue waits while the queue is full, which pushes back on intake, and dequeue waits while it is empty.
+    Each patient is stored with the time it joined the queue, so the time spent waiting can be reported.
+    """
+
+    # Constructor
+    def __init__(self, maxsize=0, clock=time.monotonic):
+        self.maxsize = maxsize
+        self._clock = clock
+        self._waiting = deque()  # (patient, enqueue time), front of the queue first
+        self._getters = deque()  # futures of the coroutines waiting for a patient
+        self._putters = deque()  # futures of the coroutines waiting for room
+        self._unfinished = 0  # patients enqueued whose consultation has not been marked done
+        self._all_done = None  # asyncio.Event set while every consultation is done, created on first use
+
+    def __len__(self):
+        return len(self._waiting)
+
+    def is_empty(self):
+        return len(self._waiting) == 0
+
+    def is_full(self):
+        return 0 < self.maxsize <= len(self._waiting)
+
+    @staticmethod
+    def _wake_next(waiters):
+        # Wake the longest waiting coroutine that has not been cancelled
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    async def _wait(self, waiters, is_ready):
+        # Wait on a new future in waiters until is_ready(); a wakeup that arrives with a
+        # cancellation is passed on to the next waiter, so it is never lost
+        import asyncio  # asyncio is slow to import, so it is only imported when a dispatcher is used
+        loop = asyncio.get_running_loop()
+        while not is_ready():
+            waiter = loop.create_future()
+            waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                waiter.cancel()
+                if is_ready() and not waiter.cancelled():
+                    self._wake_next(waiters)
+                raise
+
+    def _append(self, patient):
+        self._waiting.append((patient, self._clock()))
+        self._unfinished += 1
+        if self._all_done is not None:
+            self._all_done.clear()
+        self._wake_next(self._getters)
+
+    # Method to add a patient, waiting for room when the queue is full
+    async def enqueue(self, patient):
+        """Add a patient to the rear of the queue, waiting until there is room."""
+        await self._wait(self._putters, lambda: not self.is_full())
+        self._append(patient)
+
+    def enqueue_nowait(self, patient):
+        """Add a patient to the rear of the queue if there is room. Returns False if the queue is full."""
+        if self.is_full():
+            return False
+        self._append(patient)
+        return True
+
+    # Method to take the next patient, waiting for one when the queue is empty
+    async def dequeue(self):
+        """
+        Remove and return (patient, enqueue time) from the front of the queue.
+        If the waiting coroutine is cancelled, no patient is taken off the queue.
+        """
+        await self._wait(self._getters, lambda: self._waiting)
+        item = self._waiting.popleft()
+        self._wake_next(self._putters)
+        return item
+
+    def requeue(self, item):
+        """Put a (patient, enqueue time) from dequeue back at the front, e.g. when its consultation was cancelled."""
+        self._waiting.appendleft(item)  # it was admitted before, so it may go over maxsize
+        self._wake_next(self._getters)
+
+    def task_done(self):
+        """Mark the consultation of a dequeued patient as finished."""
+        self._unfinished -= 1
+        if self._unfinished <= 0 and self._all_done is not None:
+            self._all_done.set()
+
+    async def join(self):
+        """Wait until every enqueued patient has been consulted."""
+        import asyncio
+        if self._unfinished <= 0:
+            return
+        if self._all_done is None:
+            self._all_done = asyncio.Event()
+        await self._all_done.wait()
+
+
+class ConsultationDispatcher:
+    """
+    Runs a consult station per doctor in one asyncio event loop.
+    Each doctor is a worker coroutine taking patients from a shared AsyncConsultationQueue and awaiting
+    consult(doctor, patient), by default a simulated consultation of consult_time seconds.
+    The queue wait and the consultation time of every patient are recorded, see get_stats.
+    """
+
+    # Constructor
+    def __init__(self, doctors, consult=None, maxsize=100, consult_time=0.01, clock=time.monotonic):
+        self.doctors = list(doctors)
+        self.queue = AsyncConsultationQueue(maxsize, clock)
+        self.consult_time = consult_time  # length of a simulated consultation, in seconds
+        self._consult = consult if consult is not None else self.simulated_consult
+        self._clock = clock
+        self._workers = []  # one task per doctor, while the dispatcher is running
+        self.consultations = []  # per patient: {'patient_id', 'doctor_id', 'wait', 'consult'} in seconds
+
+    async def simulated_consult(self, doctor, patient):
+        import asyncio
+        await asyncio.sleep(self.consult_time)
+
+    # Method run by the consult station of one doctor
+    async def doctor_worker(self, doctor):
+        """Consult patients from the queue, one at a time, until cancelled."""
+        import asyncio
+        queue, clock = self.queue, self._clock
+        while True:
+            item = await queue.dequeue()
+            patient, enqueue_time = item
+            start = clock()
+            try:
+                await self._consult(doctor, patient)
+            except asyncio.CancelledError:
+                # The station closed mid-consultation: hand the patient back instead of losing them
+                queue.requeue(item)
+                raise
+            except Exception as error:
+                print(f"Consultation of patient {patient.get_patient_id()} with {doctor.get_name()} failed: {error}")
+            else:
+                self.consultations.append({'patient_id': patient.get_patient_id(),
+                                           'doctor_id': doctor.get_doctor_id(),
+                                           'wait': start - enqueue_time, 'consult': clock() - start})
+            queue.task_done()
+
+    def start(self):
+        """Open a consult station for every doctor; must be called from a running event loop."""
+        import asyncio
+        if not self._workers:
+            self._workers = [asyncio.ensure_future(self.doctor_worker(doctor)) for doctor in self.doctors]
+
+    async def stop(self):
+        """Close the consult stations; patients being consulted are put back in the queue."""
+        import asyncio
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def admit(self, patient):
+        """Add a patient to the consultation queue, waiting while it is full."""
+        await self.queue.enqueue(patient)
+
+    async def run(self, patients):
+        """Admit the patients, wait until all of them have been consulted, then close the stations."""
+        self.start()
+        try:
+            for patient in patients:
+                await self.admit(patient)
+            await self.queue.join()
+        finally:
+            await self.stop()
+        return self.get_stats()
+
+    def get_stats(self):
+        """Summarize the recorded queue waits and consultation times, in seconds."""
+        stats = {'patients': len(self.consultations), 'per_doctor': defaultdict(int)}
+        for consultation in self.consultations:
+            stats['per_doctor'][consultation['doctor_id']] += 1
+        stats['per_doctor'] = dict(stats['per_doctor'])
+        for field in ('wait', 'consult'):
+            values = sorted(consultation[field] for consultation in self.consultations)
+            if values:
+                stats[field] = {'mean': sum(values) / len(values), 'p50': values[len(values) // 2],
+                                'p95': values[min(len(values) - 1, int(0.95 * len(values)))], 'max': values[-1]}
+        return stats
+
+
+class PatientRecordJournal:
+    """
+    Append-only operation log plus periodic snapshots, so the records survive a restart.
+    Every change is written as one JSON line to journal.log in the given directory. The log is
+    fsynced once per sync_every operations (or on sync), and every snapshot_every operations the whole
+    state is written to snapshot.jsonl and the log is started afresh. Recovery loads the snapshot
+    and replays only the operations logged after it.
+    """
+    LOG_NAME = "journal.log"
+    SNAPSHOT_NAME = "snapshot.jsonl"
+
+    # Constructor
+    def __init__(self, directory, sync_every=100, snapshot_every=100000):
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, self.LOG_NAME)
+        self._snapshot_path = os.path.join(directory, self.SNAPSHOT_NAME)
+        self.sync_every = sync_every  # operations written between two fsyncs
+        self.snapshot_every = snapshot_every  # operations logged between two automatic snapshots
+        self._log = open(self._log_path, "a", encoding="utf-8")
+        self._seq = 0  # sequence number of the last logged operation, set by recover
+        self._unsynced = 0  # operations written since the last fsync
+        self._since_snapshot = 0  # operations logged since the last snapshot
+        self._state = None  # (record_system, prescriptions, appointments) being journaled
+
+    # Conversions between the entities and plain dictionaries
+    @staticmethod
+    def patient_to_dict(patient):
+        return {'patient_id': patient.get_patient_id(), 'name': patient.get_name(),
+                'date_of_birth': patient.get_date_of_birth(), 'medical_history': patient.get_medical_history(),
+                'phone': patient.get_phone(), 'admission_date': patient.get_admission_date()}
+
+    @staticmethod
+    def patient_from_dict(data):
+        return Patient(data['name'], data['date_of_birth'], data['medical_history'], data['phone'],
+                       data['admission_date'], patient_id=data['patient_id'])
+
+    @staticmethod
+    def prescription_to_dict(prescription):
+        return {'prescription_id': prescription.get_prescription_id(), 'patient_id': prescription.get_patient_id(),
+                'doctor_id': prescription.get_doctor_id(), 'medication': prescription.get_medication(),
+                'dosage': prescription.get_dosage(), 'duration': prescription.get_duration()}
+
+    @staticmethod
+    def prescription_from_dict(data):
+        prescription = Prescription(data['patient_id'], data['doctor_id'], data['medication'], data['dosage'],
+                                    data['duration'])
+        prescription._prescription_id = data['prescription_id']  # keep the original ID
+        Prescription.id_allocator.observe(data['prescription_id'])
+        return prescription
+
+    @staticmethod
+    def appointment_to_dict(appointment):
+        return {'appointment_id': appointment.get_appointment_id(), 'patient_id': appointment.get_patient_id(),
+                'doctor_id': appointment.get_doctor_id(), 'date': appointment.get_date(),
+                'time': appointment.get_time(), 'reason': appointment.get_reason(),
+                'duration': appointment.get_duration()}
+
+    @staticmethod
+    def appointment_from_dict(data):
+        appointment = Appointment(data['patient_id'], data['doctor_id'], data['date'], data['time'], data['reason'],
+                                  data['duration'])
+        appointment._appointment_id = data['appointment_id']  # keep the original ID
+        Appointment.id_allocator.observe(data['appointment_id'])
+        return appointment
+
+    def attach(self, record_system, prescriptions, appointments):
+        """Start journaling the given state; snapshots are taken from it."""
+        self._state = (record_system, prescriptions, appointments)
+        record_system.journal = self
+
+    # Method to append one operation to the log
+    def log(self, op, **data):
+        self._write(op, data)
+        self._after_write()
+
+    # Method to append the operations of a batch that has already been applied
+    def log_many(self, op, entries):
+        """
+        Log one op per dictionary in entries. An automatic snapshot is only taken once all of them are
+        in the log: the state already holds the whole batch, so a snapshot taken part way through would
+        also hold the rows logged after it, and recovery would apply those rows twice.
+        """
+        for data in entries:
+            self._write(op, data)
+        self._after_write()
+
+    def _write(self, op, data):
+        self._seq += 1
+        data['seq'] = self._seq
+        data['op'] = op
+        self._log.write(json.dumps(data, separators=(',', ':')) + "\n")
+        self._unsynced += 1
+        self._since_snapshot += 1
+
+    def _after_write(self):
+        if self._unsynced >= self.sync_every:
+            self.sync()
+        if self._state is not None and self._since_snapshot >= self.snapshot_every:
+            self.snapshot(*self._state)
+
+    def sync(self):
+        """Flush the logged operations to disk."""
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self._log.close()
+
+    def snapshot(self, record_system, prescriptions, appointments):
+        """Write the whole state to the snapshot file, then start a new, empty log."""
+        temporary_path = self._snapshot_path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as snapshot:
+            write = snapshot.write
+            write(json.dumps({'type': 'header', 'seq': self._seq}) + "\n")
+            for patient in record_system.records[:record_system.next_index]:
+                if patient is not None:
+                    write(json.dumps(dict(self.patient_to_dict(patient), type='patient'), separators=(',', ':')) + "\n")
+            for stack in prescriptions.values():
+                for prescription in stack.get_items():  # bottom of the stack first
+                    write(json.dumps(dict(self.prescription_to_dict(prescription), type='prescription'),
+                                     separators=(',', ':')) + "\n")
+            for queue in appointments.values():
+                for appointment in queue.get_appointments():  # front of the queue first
+                    write(json.dumps(dict(self.appointment_to_dict(appointment), type='appointment'),
+                                     separators=(',', ':')) + "\n")
+            snapshot.flush()
+            os.fsync(snapshot.fileno())
+        # The snapshot only replaces the old one once it is complete on disk
+        os.replace(temporary_path, self._snapshot_path)
+        self._log.close()
+        self._log = open(self._log_path, "w", encoding="utf-8")
+        self._unsynced = 0
+        self._since_snapshot = 0
+
+    def _apply(self, entry, record_system, prescriptions, appointments):
+        # Apply one snapshot row or log operation to the state
+        kind = entry.get('op') or entry.get('type')
+        if kind in ('patient', 'add_patient'):
+            record_system.add_patient(self.patient_from_dict(entry))
+        elif kind == 'update_patient':
+            record_system.update_patient(entry['patient_id'], entry.get('name'), entry.get('date_of_birth'),
+                                         entry.get('medical_history'), entry.get('phone'),
+                                         entry.get('admission_date'))
+        elif kind == 'delete_patient':
+            record_system._remove_patient(entry['patient_id'])
+        elif kind in ('prescription', 'push_prescription'):
+            prescriptions[entry['patient_id']].push(self.prescription_from_dict(entry))
+        elif kind in ('appointment', 'enqueue_appointment'):
+            appointments[entry['patient_id']].enqueue(self.appointment_from_dict(entry))
+
+    def recover(self, record_system, prescriptions, appointments):
+        """
+        Load the latest snapshot into the given (empty) state and replay the operations logged after it.
+        Returns the number of snapshot rows and log operations applied.
+        """
+        record_system.journal = None  # replaying must not log the operations again
+        snapshot_seq = 0
+        snapshot_rows = replayed = 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as snapshot:
+                for line in snapshot:
+                    entry = json.loads(line)
+                    if entry['type'] == 'header':
+                        snapshot_seq = entry['seq']
+                    else:
+                        self._apply(entry, record_system, prescriptions, appointments)
+                        snapshot_rows += 1
+        self._seq = snapshot_seq
+        self._log.flush()
+        valid_length = 0  # bytes of the log holding complete operations
+        with open(self._log_path, "rb") as log:
+            for line in log:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete line")
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # a torn last line from a crash, everything before it is intact
+                valid_length += len(line)
+                if entry['seq'] <= snapshot_seq:
+                    continue  # already part of the snapshot
+                self._apply(entry, record_system, prescriptions, appointments)
+                self._seq = entry['seq']
+                replayed += 1
+        if valid_length < os.path.getsize(self._log_path):
+            # Cut the torn line off, so new operations are not appended after it
+            self._log.close()
+            os.truncate(self._log_path, valid_length)
+            self._log = open(self._log_path, "a", encoding="utf-8")
+        self._since_snapshot = replayed
+        self.attach(record_system, prescriptions, appointments)
+        return snapshot_rows, replayed
+
+
+class PatientArchive:
+    """
+    Read-only on-disk copy of the patient records, opened with mmap.
+    The archive file holds a header and one fixed-width binary row per patient, sorted by patient ID
+    (see patient_id_key); every field is stored as the (offset, length) of its exact text in a side heap
+    file (path + '.heap'), so patients read back exactly as they were written, whatever their ID prefix
+    or date format. Lookups binary-search the mapped rows, and a Patient is only built for the rows actually read.
+    """
+    MAGIC = b"HPARCH02"
+    HEADER = struct.Struct("<8sQ")  # magic, number of rows
+    FIELDS = ('patient_id', 'name', 'date_of_birth', 'medical_history', 'phone', 'admission_date')
+    # The sort key of the patient ID (heap offset and length of its prefix, then its number), then
+    # the (offset, length) in the heap of each of FIELDS
+    ROW = struct.Struct("<QIq" + "QI" * len(FIELDS))
+    ID_KEY = struct.Struct("<QIq")
+    NONE_LENGTH = 0xFFFFFFFF  # length stored for a field that is None
+    MAX_ID_NUMBER = (1 << 63) - 1
+
+    # Constructor
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._heap_file = open(path + ".heap", "rb")
+        self._rows = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        heap_size = os.fstat(self._heap_file.fileno()).st_size
+        # An empty file cannot be mapped, and an empty heap has nothing to read anyway
+        self._heap = mmap.mmap(self._heap_file.fileno(), 0, access=mmap.ACCESS_READ) if heap_size else b""
+        magic, self._count = self.HEADER.unpack_from(self._rows, 0)
+        if magic != self.MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a patient archive (or was written by an older version)")
+        self._prefixes = {}  # maps the heap offset of an ID prefix to the decoded prefix
+
+    def __len__(self):
+        return self._count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for mapping in (self._rows, self._heap):
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+        self._file.close()
+        self._heap_file.close()
+
+    @staticmethod
+    def write(record_system, path):
+        """
+        Write the live records of a PatientRecordSystem to an archive at path. Returns the number of rows.
+        Raises ValueError, before anything is written, if a field is neither a string nor None,
+        or the number in a patient ID does not fit in 64 bits.
+        """
+        patients = [patient for patient in record_system.records[:record_system.next_index] if patient is not None]
+        if not record_system._ordered_by_id:
+            Patient.sort_records(patients, 'Patient_id')
+        getters = [getattr(Patient, f'get_{field}') for field in PatientArchive.FIELDS]
+        for patient in patients:
+            for field, getter in zip(PatientArchive.FIELDS, getters):
+                value = getter(patient)
+                if value is not None and not isinstance(value, str):
+                    raise ValueError(f"The {field} of patient {patient.get_patient_id()} is not text "
+                                     f"({type(value).__name__}), it cannot be archived")
+            if patient_id_key(patient.get_patient_id())[1] > PatientArchive.MAX_ID_NUMBER:
+                raise ValueError(f"The number in patient ID {patient.get_patient_id()} is too large to archive")
+        offsets = {None: (0, PatientArchive.NONE_LENGTH)}  # repeated texts such as histories are stored once
+        heap_size = 0
+        with open(path, "wb") as rows, open(path + ".heap", "wb") as heap:
+            rows.write(PatientArchive.HEADER.pack(PatientArchive.MAGIC, len(patients)))
+
+            def heap_slot(text):
+                nonlocal heap_size
+                slot = offsets.get(text)
+                if slot is None:
+                    data = text.encode("utf-8")
+                    heap.write(data)
+                    slot = offsets[text] = (heap_size, len(data))
+                    heap_size += len(data)
+                return slot
+
+            for patient in patients:
+                prefix, number = patient_id_key(patient.get_patient_id())
+                rows.write(PatientArchive.ROW.pack(*heap_slot(prefix), number,
+                                                   *(part for getter in getters for part in heap_slot(getter(patient)))))
+        return len(patients)
+
+    def _text(self, offset, length):
+        if length == self.NONE_LENGTH:
+            return None
+        return self._heap[offset:offset + length].decode("utf-8")
+
+    def _id_key(self, row):
+        # The patient_id_key of the row's patient, read without decoding the patient ID itself
+        prefix_offset, prefix_length, number = self.ID_KEY.unpack_from(self._rows, self.HEADER.size + row * self.ROW.size)
+        prefix = self._prefixes.get(prefix_offset)
+        if prefix is None:
+            prefix = self._prefixes[prefix_offset] = self._text(prefix_offset, prefix_length)
+        return (prefix, number)
+
+    def get_patient(self, row):
+        """Build the Patient stored in the given row."""
+        values = self.ROW.unpack_from(self._rows, self.HEADER.size + row * self.ROW.size)
+        patient_id, name, date_of_birth, medical_history, phone, admission_date = (
+            self._text(values[index], values[index + 1]) for index in range(3, len(values), 2))
+        return Patient(name, date_of_birth, medical_history, phone, admission_date, patient_id=patient_id)
+
+    def __iter__(self):
+        for row in range(self._count):
+            yield self.get_patient(row)
+
+    def binary_search_patient(self, patient_id):
+        """
+        Perform a binary search on the mapped rows, returns the Patient or None if it is not archived.
+        """
+        key = patient_id_key(patient_id)
+        left, right = 0, self._count
+        while left < right:
+            mid = (left + right) // 2
+            if self._id_key(mid) < key:
+                left = mid + 1
+            else:
+                right = mid
+        # IDs such as HP7 and HP007 share a key, so check every row with the key for the exact ID
+        while left < self._count and self._id_key(left) == key:
+            patient = self.get_patient(left)
+            if patient.get_patient_id() == patient_id:
+                return patient
+            left += 1
+        return None  # Patient not found
+
+    def search_patient(self, patient_id):
+        return self.binary_search_patient(patient_id)
 
 
-def add_patient_to_consultation_queue(patient_id, patient_records):
+class OperationStats:
+    """Call count, error count and latency histogram of one instrumented operation"""
+    __slots__ = ('count', 'errors', 'total_ns', 'buckets')
+
+    # Constructor
+    def __init__(self, bucket_count):
+        self.count = 0
+        self.errors = 0  # calls that raised an exception
+        self.total_ns = 0
+        self.buckets = [0] * bucket_count  # calls per latency bucket, the last one catching everything slower
+
+    def record(self, elapsed_ns, bucket):
+        self.count += 1
+        self.total_ns += elapsed_ns
+        self.buckets[bucket] += 1
+
+
+class Instrumentation:
+    """
+    Opt-in instrumentation of the public operations of the data structures.
+    enable() replaces the public methods of the instrumented classes with wrappers that count the calls,
+    time them into a latency histogram and track the size and high-water mark of each structure;
+    disable() puts the original methods back, so when instrumentation is off it costs nothing at all.
+    Snapshots can be exported as JSON or in the Prometheus text format, to a file or an HTTP endpoint.
+    """
+    # Upper bounds of the latency buckets, in seconds (Prometheus "le" labels)
+    BUCKET_BOUNDS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1.0, 5.0)
+
+    # Constructor
+    def __init__(self):
+        self._bounds_ns = [bound * 1e9 for bound in self.BUCKET_BOUNDS]
+        self._operations = {}  # maps (class name, method name) to OperationStats
+        self._sizes = {}  # maps class name to [last observed size, high-water mark]
+        self._originals = {}  # maps (class, method name) to the original function while enabled
+
+    @staticmethod
+    def instrumented_classes():
+        """Map each instrumented class to a function returning the size of an instance (None if unknown)."""
+        return {
+            PatientRecordSystem: len,
+            ConcurrentPatientRecordSystem: len,
+            Queue: len,
+            BlockingQueue: len,
+            Stack: len,
+            SinglyLinkedList: len,
+            DoublyLinkedList: len,
+            Doctor: lambda doctor: len(doctor._appointments),
+        }
+
+    def is_enabled(self):
+        return bool(self._originals)
+
+    def enable(self):
+        """Start instrumenting the public methods of the instrumented classes."""
+        if self.is_enabled():
+            return
+        for cls, size_of in self.instrumented_classes().items():
+            for name, function in list(vars(cls).items()):
+                # Only plain public methods; static and class methods are left alone
+                if name.startswith('_') or not callable(function) or isinstance(function, (staticmethod, classmethod)):
+                    continue
+                self._originals[(cls, name)] = function
+                setattr(cls, name, self._wrap(cls.__name__, name, function, size_of))
+
+    def disable(self):
+        """Put the original methods back; the collected statistics are kept until reset()."""
+        for (cls, name), function in self._originals.items():
+            setattr(cls, name, function)
+        self._originals = {}
+
+    def reset(self):
+        """Forget the collected statistics."""
+        # The statistics are cleared in place, as the installed wrappers hold on to them
+        for stats in self._operations.values():
+            stats.count = stats.errors = stats.total_ns = 0
+            stats.buckets[:] = [0] * len(stats.buckets)
+        for sizes in self._sizes.values():
+            sizes[:] = [None, None]
+
+    def _wrap(self, class_name, name, function, size_of):
+        stats = self._operations.get((class_name, name))
+        if stats is None:
+            stats = self._operations[(class_name, name)] = OperationStats(len(self._bounds_ns) + 1)
+        sizes = self._sizes.setdefault(class_name, [None, None])
+        bounds = self._bounds_ns
+        clock = time.perf_counter_ns
+
+        def instrumented(structure, *args, **kwargs):
+            start = clock()
+            try:
+                return function(structure, *args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                elapsed = clock() - start
+                stats.record(elapsed, bisect_left(bounds, elapsed))
+                size = size_of(structure)
+                if size is not None:
+                    sizes[0] = size
+                    if sizes[1] is None or size > sizes[1]:
+                        sizes[1] = size
+
+        instrumented.__name__ = function.__name__
+        instrumented.__qualname__ = function.__qualname__
+        instrumented.__doc__ = function.__doc__
+        instrumented.__wrapped__ = function
+        return instrumented
+
+    def snapshot(self):
+        """Return the collected statistics as a dictionary of plain values."""
+        labels = [str(bound) for bound in self.BUCKET_BOUNDS] + ['+Inf']
+        operations = {}
+        for (class_name, name), stats in sorted(self._operations.items()):
+            if stats.count:
+                operations[f"{class_name}.{name}"] = {
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'total_seconds': stats.total_ns / 1e9,
+                    'buckets': dict(zip(labels, stats.buckets)),
+                }
+        sizes = {class_name: {'size': size, 'high_water': high_water}
+                 for class_name, (size, high_water) in sorted(self._sizes.items()) if size is not None}
+        return {'timestamp': time.time(), 'enabled': self.is_enabled(), 'operations': operations, 'sizes': sizes}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Return the collected statistics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = ["# HELP hospital_operation_duration_seconds Latency of the data structure operations.",
+                 "# TYPE hospital_operation_duration_seconds histogram"]
+        for operation, stats in snapshot['operations'].items():
+            class_name, name = operation.split('.')
+            labels = f'structure="{class_name}",operation="{name}"'
+            cumulative = 0
+            for bound, count in stats['buckets'].items():
+                cumulative += count
+                lines.append(f'hospital_operation_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"hospital_operation_duration_seconds_sum{{{labels}}} {stats['total_seconds']}")
+            lines.append(f"hospital_operation_duration_seconds_count{{{labels}}} {stats['count']}")
+        lines += ["# HELP hospital_operation_errors_total Operations that raised an exception.",
+                  "# TYPE hospital_operation_errors_total counter"]
+        for operation, stats in snapshot['operations'].items():
+            class_name, name = operation.split('.')
+            lines.append(f'hospital_operation_errors_total{{structure="{class_name}",operation="{name}"}} '
+                         f"{stats['errors']}")
+        for metric, field, description in (("hospital_structure_size", 'size', "Last observed number of items."),
+                                           ("hospital_structure_high_water", 'high_water',
+                                            "Largest observed number of items.")):
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} gauge"]
+            for class_name, sizes in snapshot['sizes'].items():
+                lines.append(f'{metric}{{structure="{class_name}"}} {sizes[field]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, destination, format='json'):
+        """
+        Write a snapshot as 'json' or 'prometheus' text to destination, a file path or an http(s):// URL
+        that the snapshot is POSTed to (e.g. a Prometheus Pushgateway). Returns True on success.
+        """
+        if format not in ('json', 'prometheus'):
+            print(f"Unknown metrics format {format!r}, expected 'json' or 'prometheus'.")
+            return False
+        body = self.to_json() if format == 'json' else self.to_prometheus()
+        if destination.startswith(('http://', 'https://')):
+            import urllib.request  # only needed when pushing to an endpoint
+            content_type = 'application/json' if format == 'json' else 'text/plain; version=0.0.4'
+            request = urllib.request.Request(destination, data=body.encode('utf-8'), method='POST',
+                                             headers={'Content-Type': content_type})
+            try:
+                with urllib.request.urlopen(request, timeout=10) as response:
+                    response.read()
+            except OSError as error:
+                print(f"Could not push the metrics to {destination}: {error}")
+                return False
+            return True
+        # Write to a temporary file first, so a scraper never reads a half-written snapshot
+        temporary_path = destination + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            file.write(body)
+        os.replace(temporary_path, destination)
+        return True
+
+
+def add_patient_to_consultation_queue(patient_id, patient_records, priority=None):
     """
     This function adds a patient to the consultation queue.
+    patient_records is a PatientRecordSystem or a dictionary mapping patient IDs to patients.
+    The priority is only used when the consultation queue is a TriageQueue.
     """
 
     # Ensure the patient exists in the patient_records before enqueuing
-    if patient_id in patient_records:
-        consultation_queue.enqueue(patient_records[patient_id])
+    consultation_queue = get_consultation_queue()
+    if isinstance(patient_records, PatientRecordSystem):
+        patient = patient_records.search_patient(patient_id)
+    else:
+        patient = patient_records.get(patient_id)
+    if patient is not None:
+        if priority is None:
+            consultation_queue.enqueue(patient)
+        else:
+            consultation_queue.enqueue(patient, priority)
         print(f"Patient {patient_id} added to the consultation queue.")
     else:
         print("Patient record not found.")
@@ -763,6 +3624,7 @@ def consult_next_patient():
     """
     This function dequeues the next patient from the consultation queue for consultation.
     """
+    consultation_queue = get_consultation_queue()
     if not consultation_queue.is_empty():
         next_patient = consultation_queue.dequeue()
         print(f"Now consulting patient {next_patient.get_patient_id()}.")
@@ -770,188 +3632,1071 @@ def consult_next_patient():
     else:
         print("No more patients in the queue.")
 
-def patient_generator(n):
-    patients = []
-    for i in range(n):
-        name = random.choice(list(RandomNames)).value  # Randomly select a name from the enum
-        date_of_birth = f"{random.randint(1950, 2000)}-{random.randint(1, 12)}-{random.randint(1, 28)}"  # Generate a random date of birth
-        medical_history = random.choice(list(RandomMedicalHistory)).value  # Randomly select medical history from the enum
-        phone = f"+{random.randint(1, 999)}-{random.randint(100, 999)}-{random.randint(1000000, 9999999)}"  # Generate a random phone number
-        admission_date = f"{random.randint(2020, 2023)}-{random.randint(1, 12)}-{random.randint(1, 28)}"  # Generate a random admission date
-
-        # Create a Patient object with the generated data
-        patient = Patient(name, date_of_birth, medical_history, phone, admission_date)
-        consultation_queue.enqueue(patient)  # Enqueue the patient into the consultation queue
-        patients.append(patient)  # Add the patient to the list of patients
+def run_consultations(patients, doctors, **options):
+    """
+    Consult the patients at one station per doctor in an asyncio event loop and return the statistics.
+    The options are passed on to ConsultationDispatcher, e.g. maxsize, consult or consult_time.
+    """
+    import asyncio
+    return asyncio.run(ConsultationDispatcher(doctors, **options).run(patients))
+
+def push_prescription(patient_id, prescription):
+    """
+    This function pushes a prescription onto the patient's prescription stack, and logs it when persistence is enabled.
+    """
+    get_prescription_stacks()[patient_id].push(prescription)
+    journal = get_patient_records_system().journal
+    if journal is not None:
+        journal.log('push_prescription', **PatientRecordJournal.prescription_to_dict(prescription))
+
+def enqueue_appointment(patient_id, appointment):
+    """
+    This function adds an appointment to the patient's appointment queue, and logs it when persistence is enabled.
+    """
+    get_appointment_queues()[patient_id].enqueue(appointment)
+    journal = get_patient_records_system().journal
+    if journal is not None:
+        journal.log('enqueue_appointment', **PatientRecordJournal.appointment_to_dict(appointment))
+
+# Streaming import and export, in CSV or JSON Lines depending on the file extension
+PATIENT_FIELDS = ('patient_id', 'name', 'date_of_birth', 'medical_history', 'phone', 'admission_date')
+PRESCRIPTION_FIELDS = ('prescription_id', 'patient_id', 'doctor_id', 'medication', 'dosage', 'duration')
+APPOINTMENT_FIELDS = ('appointment_id', 'patient_id', 'doctor_id', 'date', 'time', 'reason', 'duration')
+
+
+def read_row_chunks(path, chunk_size=10000, parse_json=True):
+    """
+    Stream the rows of a .csv or .jsonl file as lists of at most chunk_size dictionaries,
+    so files larger than memory can be processed.
+    With parse_json=False the lines of a .jsonl file are passed on unparsed, so the caller can
+    deal with invalid lines one at a time (json.loads would otherwise raise here).
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.endswith(".jsonl"):
+            lines = (line for line in file if line.strip())
+            rows = map(json.loads, lines) if parse_json else lines
+        else:
+            rows = csv.DictReader(file)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def write_rows(rows, fields, path, buffer_size=1 << 20):
+    """Stream dictionaries to a .csv or .jsonl file through a large write buffer. Returns the number of rows."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8", buffering=buffer_size) as file:
+        if path.endswith(".jsonl"):
+            for row in rows:
+                file.write(json.dumps(row, separators=(',', ':')) + "\n")
+                count += 1
+        else:
+            writer = csv.DictWriter(file, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def _report_throughput(action, kind, rows, rejected, elapsed):
+    # Print and return the throughput of an import or export
+    stats = {"rows": rows, "rejected": rejected, "seconds": elapsed,
+             "rows_per_second": rows / elapsed if elapsed > 0 else float("inf")}
+    print(f"{action} {rows} {kind} ({rejected} rejected) in {elapsed:.2f} s, {stats['rows_per_second']:,.0f} rows/s")
+    return stats
+
+
+def _import_rows(path, kind, required, build, consume, chunk_size):
+    # Parse, validate and build the rows chunk by chunk, then hand every chunk of objects to consume,
+    # which may return how many of them it refused
+    start = time.perf_counter()
+    imported = rejected = 0
+    for chunk in read_row_chunks(path, chunk_size, parse_json=False):
+        objects = []
+        for row in chunk:
+            try:
+                if isinstance(row, str):
+                    row = json.loads(row)  # a JSONDecodeError is a ValueError, so the line is rejected
+                if not isinstance(row, dict):
+                    raise ValueError("not an object")
+                if any(not row.get(field) for field in required):
+                    raise ValueError("missing field")
+                objects.append(build(row))
+            except (TypeError, ValueError):
+                rejected += 1
+        refused = consume(objects) or 0
+        imported += len(objects) - refused
+        rejected += refused
+    return _report_throughput("Imported", kind, imported, rejected, time.perf_counter() - start)
+
+
+def import_patients(path, record_system, chunk_size=10000):
+    """
+    Import patients from a .csv or .jsonl file into a PatientRecordSystem.
+    Rows without a patient_id get a new one. Each chunk is merged into the records with one add_patients
+    call; rows whose ID is already taken, or that no longer fit, count as rejected.
+    """
+    def build(row):
+        return Patient(row['name'], row['date_of_birth'], row.get('medical_history', ''), row.get('phone', ''),
+                       row['admission_date'], patient_id=row.get('patient_id') or None)
+
+    def consume(patients):
+        return sum(result['status'] != 'added' for result in record_system.add_patients(patients))
+
+    return _import_rows(path, "patients", ('name', 'date_of_birth', 'admission_date'), build, consume, chunk_size)
+
+
+def _journal_of(container, position, journal=None):
+    # The journal to log imported rows to: the given one, or else the journal of the module's record system
+    # when it journals this container (position 1 for the prescription stacks, 2 for the appointment queues)
+    if journal is None:
+        system = globals().get('patient_records_system')
+        journal = system.journal if system is not None else None
+        if journal is None or journal._state is None or journal._state[position] is not container:
+            return None
+    return journal
+
+
+def import_prescriptions(path, prescription_stacks, chunk_size=10000, journal=None):
+    """
+    Import prescriptions from a .csv or .jsonl file, pushing each onto its patient's stack in file order.
+    Each chunk is logged after it is pushed, to journal or to the journal that covers prescription_stacks.
+    """
+    journal = _journal_of(prescription_stacks, 1, journal)
 
+    def consume(new_prescriptions):
+        for prescription in new_prescriptions:
+            prescription_stacks[prescription.get_patient_id()].push(prescription)
+        if journal is not None:
+            journal.log_many('push_prescription', map(PatientRecordJournal.prescription_to_dict, new_prescriptions))
+
+    return _import_rows(path, "prescriptions", PRESCRIPTION_FIELDS, PatientRecordJournal.prescription_from_dict,
+                        consume, chunk_size)
+
+
+def import_appointments(path, appointment_queues, chunk_size=10000, journal=None):
+    """
+    Import appointments from a .csv or .jsonl file, enqueuing each in its patient's queue in file order.
+    Each chunk is logged after it is enqueued, to journal or to the journal that covers appointment_queues.
+    """
+    journal = _journal_of(appointment_queues, 2, journal)
+
+    def build(row):
+        row['duration'] = int(row.get('duration') or 30)
+        return PatientRecordJournal.appointment_from_dict(row)
+
+    def consume(new_appointments):
+        for appointment in new_appointments:
+            appointment_queues[appointment.get_patient_id()].enqueue(appointment)
+        if journal is not None:
+            journal.log_many('enqueue_appointment', map(PatientRecordJournal.appointment_to_dict, new_appointments))
+
+    return _import_rows(path, "appointments", APPOINTMENT_FIELDS[:-1], build, consume, chunk_size)
+
+
+def export_patients(record_system, path):
+    """Export the live records of a PatientRecordSystem, in ID order, to a .csv or .jsonl file."""
+    start = time.perf_counter()
+    rows = (PatientRecordJournal.patient_to_dict(patient)
+            for patient in record_system.records[:record_system.next_index] if patient is not None)
+    count = write_rows(rows, PATIENT_FIELDS, path)
+    return _report_throughput("Exported", "patients", count, 0, time.perf_counter() - start)
+
+
+def export_prescriptions(prescription_stacks, path):
+    """Export every prescription stack, bottom of each stack first, to a .csv or .jsonl file."""
+    start = time.perf_counter()
+    rows = (PatientRecordJournal.prescription_to_dict(prescription)
+            for stack in prescription_stacks.values() for prescription in stack.get_items())
+    count = write_rows(rows, PRESCRIPTION_FIELDS, path)
+    return _report_throughput("Exported", "prescriptions", count, 0, time.perf_counter() - start)
+
+
+def export_appointments(appointment_queues, path):
+    """Export every appointment queue, front of each queue first, to a .csv or .jsonl file."""
+    start = time.perf_counter()
+    rows = (PatientRecordJournal.appointment_to_dict(appointment)
+            for queue in appointment_queues.values() for appointment in queue.get_appointments())
+    count = write_rows(rows, APPOINTMENT_FIELDS, path)
+    return _report_throughput("Exported", "appointments", count, 0, time.perf_counter() - start)
+
+
+_generator_tables = {}  # value tables of the batch patient generator, built on first use
+
+
+def _get_generator_tables():
+    # Every value is picked from a precomputed table, so a whole chunk is drawn with one random.choices call
+    # per field; picking a date uniformly from all combinations equals picking year, month and day uniformly
+    if not _generator_tables:
+        days = range(1, 29)
+        months = range(1, 13)
+        _generator_tables.update(
+            names=[name.value for name in RandomNames],
+            histories=[entry.value for entry in RandomMedicalHistory],
+            dates_of_birth=[f"{year}-{month}-{day}" for year in range(1950, 2001) for month in months for day in days],
+            admission_dates=[f"{year}-{month}-{day}" for year in range(2020, 2024) for month in months for day in days],
+            phone_areas=[f"{area}-" for area in range(100, 1000)],
+            country_codes=[f"+{country}-" for country in range(1, 1000)],
+            # a number between 1000000 and 9999999 is three leading digits (100-999) and four more (0000-9999)
+            number_heads=[str(head) for head in range(100, 1000)],
+            number_tails=[f"{tail:04d}" for tail in range(10000)],
+        )
+    return _generator_tables
+
+
+def _random_patient_columns(rng, k):
+    # Draw k random patients, one column per field except the patient ID
+    tables = _get_generator_tables()
+    choices = rng.choices
+    phones = list(map(''.join, zip(choices(tables['country_codes'], k=k), choices(tables['phone_areas'], k=k),
+                                   choices(tables['number_heads'], k=k), choices(tables['number_tails'], k=k))))
+    return {
+        'name': choices(tables['names'], k=k),
+        'date_of_birth': choices(tables['dates_of_birth'], k=k),
+        'medical_history': choices(tables['histories'], k=k),
+        'phone': phones,
+        'admission_date': choices(tables['admission_dates'], k=k),
+    }
+
+
+def patient_column_batches(n, seed=None, chunk_size=100000):
+    """
+    Generate n random patients as columns: yields dictionaries mapping each field in PATIENT_FIELDS
+    to a list of at most chunk_size values. Patient IDs are reserved, so they never collide with
+    patients created later. The same seed always produces the same values.
+    """
+    rng = random.Random(seed)
+    remaining = n
+    while remaining > 0:
+        k = min(chunk_size, remaining)
+        remaining -= k
+        columns = _random_patient_columns(rng, k)
+        first_id = Patient.id_allocator.reserve(k)
+        columns['patient_id'] = [f"HP{number}" for number in range(first_id, first_id + k)]
+        yield columns
+
+
+def patient_batches(n, seed=None, chunk_size=10000):
+    """Generate n random patients, yielding them as lists of at most chunk_size Patient objects."""
+    rng = random.Random(seed)
+    remaining = n
+    while remaining > 0:
+        k = min(chunk_size, remaining)
+        remaining -= k
+        columns = _random_patient_columns(rng, k)
+        yield list(map(Patient, columns['name'], columns['date_of_birth'], columns['medical_history'],
+                       columns['phone'], columns['admission_date']))
+
+
+def patient_generator(n, queue=None, record_system=None, seed=None):
+    """
+    Generate n random patients and return them as a list.
+    They are also enqueued into queue and added to record_system when those are given.
+    """
+    patients = []
+    for batch in patient_batches(n, seed):
+        if queue is not None:
+            for patient in batch:
+                queue.enqueue(patient)  # Enqueue the patients into the queue
+        if record_system is not None:
+            for patient in batch:
+                record_system.add_patient(patient)
+        patients.extend(batch)  # Add the patients to the list of patients
     return patients
 
-# Initialize patient records system and consultation queue
-patient_records_system = PatientRecordSystem(max_patients=100)
-consultation_queue = Queue()
 
-# Dictionary to store doctors
-doctors = {}
-
-# Dictionary to store prescriptions stack for each patient
-prescriptions = defaultdict(Stack)
-
-# Dictionary to store appointments queue for each patient
-appointments = defaultdict(Queue)
-
-# Some instances to test the code:
-# Creating patient objects
-patient1 = Patient("Hamad Alnuaimi", "2004-02-12", "No significant medical history", "0509997667", "2024-04-01")
-patient2 = Patient("Rashed Alghafri", "1985-10-20", "Allergic to penicillin", "0509999999", "2024-04-02")
-
-# Creating doctor objects
-doctor1 = Doctor("Dr. Smith", "Cardiologist")
-doctor2 = Doctor("Dr. Johnson", "Orthopedic Surgeon")
-
-# Creating appointment objects
-appointment1 = Appointment(patient1, doctor1, "2024-04-05", "10:00", "Regular checkup")
-appointment2 = Appointment(patient2, doctor2, "2024-04-06", "11:00", "Knee pain evaluation")
-
-# Creating prescription objects
-prescription1 = Prescription(patient1.get_patient_id(), doctor1.get_doctor_id(), "Aspirin", "100mg", "2 weeks")
-prescription2 = Prescription(patient2.get_patient_id(), doctor2.get_doctor_id(), "Ibuprofen", "200mg", "1 week")
-
-# Creating record objects
-record1 = Record(patient1.get_patient_id(), "High blood pressure", "Prescribed medication and lifestyle changes")
-record2 = Record(patient2.get_patient_id(), "Knee inflammation", "Recommended rest and physical therapy")
-
-# Some functions to test the code:
-# Add patients to consultation queue
-consultation_queue.enqueue(patient1)
-consultation_queue.enqueue(patient2)
-
-# Consult next patient
-consult_next_patient()
-
-# Schedule appointments for patients
-doctor1.schedule_appointment(appointment1)
-doctor2.schedule_appointment(appointment2)
-
-# Add prescriptions to patients
-patient1.add_prescription(prescription1)
-patient2.add_prescription(prescription2)
-
-# Add records to patients
-patient1.add_record(record1)
-patient2.add_record(record2)
-
-# Print patient summary
-patient1.print_patient_summary()
-patient2.print_patient_summary()
-
-
-choice = 'o'
-# Main menu loop
-while choice != '0':
-    print("\nWelcome to the Hospital's System...")
-    print("1.   Add a patient")
-    print("2.   Generate random patients")
-    print("3.   Add a doctor")
-    print("4.   Create an appointment for a patient")
-    print("5.   Create a prescription for a patient")
-    print("6.   Record the patient's status")
-    print("7.   Add a patient into the queue")
-    print("8.   Add the prescription into the stack")
-    print("9.   Add the patient's appointment into the queue")
-    print("10.  Consult next patient")
-    print("0.   Exit")
-
-    choice = input("Enter your choice: ")
-
-    if choice == '1':
-        # Add a patient
-        name = input("Enter patient name: ")
-        date_of_birth = input("Enter patient's date of birth (YYYY-MM-DD): ")
-        medical_history = input("Enter patient's medical history: ")
-        phone = input("Enter patient's phone number: ")
-        admission_date = input("Enter admission date (YYYY-MM-DD): ")
-        patient = Patient(name, date_of_birth, medical_history, phone, admission_date)
-        patient_records_system.add_patient(patient)
-        print(f"A patient has been successfully created in the system, the patient id is: {patient.get_patient_id()}")
-
-
-    elif choice == '2':
-        num_patients = int(input("How many patients do you want to generate? "))
-        patient_generator(num_patients)
-        print(f"{num_patients} patients are waiting in the queue.")
-
-
-
-    elif choice == '3':
-        # Add a doctor
-        name = input("Enter doctor name: ")
-        specialty = input("Enter doctor's specialty: ")
-        doctor = Doctor( name, specialty)
-        print(f"A doctor has been successfully created in the system, the doctor id is: {doctor.get_doctor_id()}")
-
-
-    elif choice == '4':
-        patient_id = input("Enter patient ID: ")
-        doctor_id = input("Enter doctor ID: ")
-        date = input("Enter appointment date (YYYY-MM-DD): ")
-        time = input("Enter appointment time: ")
-        reason = input("Enter appointment reason: ")
-        appointment = Appointment(patient_id, doctor_id, date, time, reason)
-        appointments[patient_id].enqueue(appointment)
-        print(f"An appointment is successfully created with the ID: {appointment.get_appointment_id()}.")
-
-    elif choice == '5':
-        # Create a prescription for a patient
-        patient_id = input("Enter patient ID: ")
-        doctor_id = input("Enter doctor ID: ")
-        medication = input("Enter medication: ")
-        dosage = input("Enter dosage: ")
-        duration = input("Enter duration: ")
-        prescription = Prescription(patient_id, doctor_id, medication, dosage, duration)
-        prescriptions[patient_id].push(prescription)
-
-    elif choice == '6':
-        # Record the patient's status
-        patient_id = input("Enter patient ID: ")
-        diagnosis = input("Enter diagnosis: ")
-        treatment_plan = input("Enter treatment plan: ")
-        record = Record(patient_id, diagnosis, treatment_plan)
-        patient_records_system.search_patient(patient_id).add_record(record)
-        print(f"The patient status had been successfully recorded, recording ID: {record.get_record_id()}")
-
-    elif choice == '7':
-        # Add a patient into the queue
-        patient_id = input("Enter patient ID: ")
-        add_patient_to_consultation_queue(patient_id, patient_records_system.patient_index_map)
-
-    elif choice == '8':
-        # Add the prescription into the stack
-        patient_id = input("Enter patient ID: ")
-        doctor_id = input("Enter doctor ID: ")
-        medication = input("Enter medication: ")
-        dosage = input("Enter dosage: ")
-        duration = input("Enter duration: ")
-        prescription = Prescription(patient_id, doctor_id, medication, dosage, duration)
-        prescriptions[patient_id].push(prescription)
-
-    elif choice == '9':
-        # Add the patient's appointment into the queue
-        patient_id = input("Enter patient ID: ")
-        doctor_id = input("Enter doctor ID: ")
-        date = input("Enter appointment date (YYYY-MM-DD): ")
-        time = input("Enter appointment time: ")
-        reason = input("Enter appointment reason: ")
-        appointment = Appointment(patient_id, doctor_id, date, time, reason)
-        appointments[patient_id].enqueue(appointment)
-
-    elif choice == '10':
-        # Consult next patient
-        consult_next_patient()
-
-    elif choice == '0':
-        # Exit the program
-        print("Exiting...")
-        break
+def export_generated_patients(path, n, seed=None, chunk_size=100000):
+    """Stream n random patients to a .csv or .jsonl file without creating Patient objects."""
+    def rows():
+        for columns in patient_column_batches(n, seed, chunk_size):
+            for values in zip(*(columns[field] for field in PATIENT_FIELDS)):
+                yield dict(zip(PATIENT_FIELDS, values))
 
-    else:
-        print("Invalid choice. Please enter a valid option.")
\ No newline at end of file
+    start = time.perf_counter()
+    count = write_rows(rows(), PATIENT_FIELDS, path)
+    return _report_throughput("Generated", "patients", count, 0, time.perf_counter() - start)
+
+
+# Benchmarks to measure the efficiency of the data structures
+def _make_benchmark_patients(n):
+    """Build n patients with fixed details, so only the data structure under test is timed."""
+    return [Patient("Benchmark", "2000-1-1", RandomMedicalHistory.ENTRY_1.value, "0500000000", "2024-1-1")
+            for _ in range(n)]
+
+
+def benchmark_ordered_insert(sizes=(1000, 10000, 100000), sample=1000):
+    """
+    Time PatientRecordSystem.add_patient at growing table sizes and return the mean cost per insert,
+    for new IDs above every stored one (appended) and for IDs that fall between the stored ones
+    (inserted in the middle, shifting the records behind them).
+    """
+    results = {}
+    for size in sizes:
+        system = PatientRecordSystem(max_patients=size + sample)
+        for patient in _make_benchmark_patients(size):
+            system.add_patient(patient)
+        new_patients = _make_benchmark_patients(sample)
+        start = time.perf_counter()
+        for patient in new_patients:
+            system.add_patient(patient)
+        elapsed = time.perf_counter() - start
+        results[(size, 'appended')] = elapsed / sample * 1e6
+
+        # Hold back random patients, then add them in random order once the rest is stored
+        patients = _make_benchmark_patients(size + sample)
+        held_back = set(random.sample(range(size + sample), sample))
+        system = PatientRecordSystem(max_patients=size + sample)
+        for position, patient in enumerate(patients):
+            if position not in held_back:
+                system.add_patient(patient)
+        new_patients = [patients[position] for position in held_back]
+        random.shuffle(new_patients)
+        start = time.perf_counter()
+        for patient in new_patients:
+            system.add_patient(patient)
+        elapsed = time.perf_counter() - start
+        results[(size, 'interleaved')] = elapsed / sample * 1e6
+        print(f"add_patient with {size} patients stored: {results[(size, 'appended')]:.2f} us per appended insert, "
+              f"{results[(size, 'interleaved')]:.2f} us per interleaved insert")
+    return results
+
+
+def benchmark_sort(sizes=(1000, 10000, 100000)):
+    """
+    Time Patient.sort_records on random, sorted and reverse-sorted records and return the seconds per sort.
+    """
+    results = {}
+    for size in sizes:
+        patients = _make_benchmark_patients(size)
+        for patient in patients:
+            # Unpadded, like the dates of the patient generator
+            patient.set_admission_date(f"{random.randint(2020, 2023)}-{random.randint(1, 12)}-{random.randint(1, 28)}")
+        shuffled = patients[:]
+        random.shuffle(shuffled)
+        orders = {"random": shuffled, "sorted": patients, "reversed": patients[::-1]}
+        for order, records in orders.items():
+            for sort_key in ('Patient_id', ('Admission_date', 'Name')):
+                records_copy = records[:]
+                start = time.perf_counter()
+                Patient.sort_records(records_copy, sort_key)
+                elapsed = time.perf_counter() - start
+                label = sort_key if isinstance(sort_key, str) else '+'.join(sort_key)
+                results[(size, order, label)] = elapsed
+                print(f"sort_records of {size} {order} records by {label}: {elapsed * 1000:.2f} ms")
+    return results
+
+
+def benchmark_triage_queue(sizes=(100000, 1000000)):
+    """
+    Compare the throughput of the FIFO Queue and the TriageQueue when n patients are queued and then drained.
+    """
+    results = {}
+    levels = list(TriageLevel)
+    for size in sizes:
+        patients = _make_benchmark_patients(size)
+        priorities = random.choices(levels, k=size)
+
+        fifo = Queue()
+        start = time.perf_counter()
+        for patient in patients:
+            fifo.enqueue(patient)
+        while not fifo.is_empty():
+            fifo.dequeue()
+        fifo_elapsed = time.perf_counter() - start
+
+        triage = TriageQueue()
+        start = time.perf_counter()
+        for patient, priority in zip(patients, priorities):
+            triage.enqueue(patient, priority)
+        while not triage.is_empty():
+            triage.dequeue()
+        triage_elapsed = time.perf_counter() - start
+
+        results[size] = {"Queue": size / fifo_elapsed, "TriageQueue": size / triage_elapsed}
+        print(f"{size} waiting patients: Queue {results[size]['Queue']:,.0f} patients/s, "
+              f"TriageQueue {results[size]['TriageQueue']:,.0f} patients/s")
+    return results
+
+
+def benchmark_memory(n=100000):
+    """
+    Report the bytes used per patient and per queue node, using tracemalloc.
+    The "before" figures use plain classes with a per-instance __dict__ and eagerly created
+    appointment lists and prescription stacks, the layout the entity classes had before __slots__.
+    """
+    import tracemalloc
+
+    class DictPatient:
+        def __init__(self, name, date_of_birth, medical_history, phone, admission_date):
+            self._patient_id = f"HP{n}"
+            self._name = name
+            self._date_of_birth = date_of_birth
+            self._medical_history = medical_history
+            self._phone = phone
+            self._admission_date = admission_date
+            self._appointments = []
+            self._prescriptions = Stack()
+            self._record = None
+
+    class DictNode:
+        def __init__(self, patient):
+            self._patient = patient
+            self._next = None
+
+    def bytes_per_item(build):
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        items = build()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del items
+        return (after - before) / n
+
+    details = ("Benchmark", "2000-1-1", RandomMedicalHistory.ENTRY_1.value, "0500000000", "2024-1-1")
+    patient = Patient(*details)
+    results = {
+        "patient_before": bytes_per_item(lambda: [DictPatient(*details) for _ in range(n)]),
+        "patient_after": bytes_per_item(lambda: [Patient(*details) for _ in range(n)]),
+        "node_before": bytes_per_item(lambda: [DictNode(patient) for _ in range(n)]),
+        "node_after": bytes_per_item(lambda: [Node(patient) for _ in range(n)]),
+        "dnode_after": bytes_per_item(lambda: [DNode(patient) for _ in range(n)]),
+    }
+    print(f"Bytes per patient: {results['patient_before']:.0f} before, {results['patient_after']:.0f} after")
+    print(f"Bytes per queue node: {results['node_before']:.0f} before, {results['node_after']:.0f} after "
+          f"({results['dnode_after']:.0f} for a doubly linked node)")
+    return results
+
+
+def benchmark_recovery(n=100000, tail=10000):
+    """
+    Time the recovery of n snapshotted patients plus a log tail of updates, reported per million patients.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = PatientRecordJournal(directory, sync_every=1000, snapshot_every=10 ** 9)
+        record_system = PatientRecordSystem(max_patients=n, growable=True)
+        journal.recover(record_system, defaultdict(Stack), defaultdict(Queue))
+        for patient in _make_benchmark_patients(n):
+            record_system.add_patient(patient)
+        journal.snapshot(record_system, {}, {})
+        for patient in record_system.records[:tail]:
+            record_system.update_patient(patient.get_patient_id(), phone="0501111111")
+        journal.close()
+
+        start = time.perf_counter()
+        recovered = PatientRecordSystem(max_patients=n, growable=True)
+        new_journal = PatientRecordJournal(directory)
+        snapshot_rows, replayed = new_journal.recover(recovered, defaultdict(Stack), defaultdict(Queue))
+        elapsed = time.perf_counter() - start
+        new_journal.close()
+
+    per_million = elapsed * 1000000 / n
+    print(f"Recovered {snapshot_rows} snapshot rows and {replayed} logged operations in {elapsed:.2f} s "
+          f"({per_million:.2f} s per million patients)")
+    return {"seconds": elapsed, "seconds_per_million": per_million}
+
+
+def benchmark_archive(n=1000000, lookups=10000):
+    """
+    Time writing an archive of n patients, opening it (cold start) and looking patients up in it.
+    """
+    import tempfile
+
+    record_system = PatientRecordSystem(max_patients=n)
+    for patient in _make_benchmark_patients(n):
+        record_system.add_patient(patient)
+    patient_ids = [patient.get_patient_id() for patient in random.sample(record_system.records, lookups)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "patients.archive")
+        start = time.perf_counter()
+        PatientArchive.write(record_system, path)
+        write_elapsed = time.perf_counter() - start
+        del record_system
+
+        start = time.perf_counter()
+        archive = PatientArchive(path)
+        open_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        for patient_id in patient_ids:
+            archive.binary_search_patient(patient_id)
+        lookup_elapsed = time.perf_counter() - start
+        archive.close()
+
+    results = {"write_seconds": write_elapsed, "open_ms": open_elapsed * 1000,
+               "lookup_us": lookup_elapsed / lookups * 1e6}
+    print(f"Archive of {n} patients: written in {write_elapsed:.2f} s, opened in {results['open_ms']:.3f} ms, "
+          f"{results['lookup_us']:.2f} us per lookup")
+    return results
+
+
+def benchmark_patient_generator(n=1000000):
+    """
+    Time the batch patient generator, both as columns and as Patient objects.
+    """
+    start = time.perf_counter()
+    for _ in patient_column_batches(n, seed=1):
+        pass
+    columns_rate = n / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in patient_batches(n, seed=1):
+        pass
+    patients_rate = n / (time.perf_counter() - start)
+    print(f"patient generator: {columns_rate:,.0f} column rows/s, {patients_rate:,.0f} Patient objects/s")
+    return {"column_rows_per_second": columns_rate, "patients_per_second": patients_rate}
+
+
+def benchmark_import_time(runs=5):
+    """
+    Time importing the module in a fresh interpreter, minus the interpreter's own start-up time.
+    """
+    import subprocess
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    module_name = os.path.splitext(os.path.basename(__file__))[0]
+
+    def best_of(code):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=directory, check=True, stdin=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    elapsed = best_of(f"import {module_name}") - best_of("pass")
+    print(f"import {module_name}: {elapsed * 1000:.1f} ms")
+    return {"import_ms": elapsed * 1000}
+
+
+def benchmark_instrumentation(n=100000):
+    """
+    Time n queue and stack operations and n patient insertions with the instrumentation off and on.
+    Once disabled the original methods are back in place, so that run should match the uninstrumented one.
+    """
+    instrumentation = Instrumentation()
+
+    def run():
+        start = time.perf_counter()
+        queue, stack = Queue(), Stack()
+        for item in range(n):
+            queue.enqueue(item)
+            stack.push(item)
+        for _ in range(n):
+            queue.dequeue()
+            stack.pop()
+        record_system = PatientRecordSystem(max_patients=n)
+        for patient in patients:
+            record_system.add_patient(patient)
+        return time.perf_counter() - start
+
+    patients = _make_benchmark_patients(n)
+    before = run()
+    instrumentation.enable()
+    patients = _make_benchmark_patients(n)
+    enabled = run()
+    instrumentation.disable()
+    patients = _make_benchmark_patients(n)
+    disabled = run()
+    print(f"{5 * n} operations: uninstrumented {before:.3f} s, instrumented {enabled:.3f} s "
+          f"({enabled / before - 1:+.0%}), disabled again {disabled:.3f} s ({disabled / before - 1:+.0%})")
+    return {"uninstrumented": before, "enabled": enabled, "disabled": disabled}
+
+
+def benchmark_concurrency(n=100000, thread_counts=(1, 2, 4, 8)):
+    """
+    Stress the thread-safe structures with 1, 2, 4 and 8 intake threads sharing one ConcurrentPatientRecordSystem.
+    Each thread creates its share of the n patients, adds and looks them up, and hands them through a bounded
+    BlockingQueue to a consumer thread. Checks that no ID was handed out twice and that every patient
+    is found again, then reports the operations per second.
+    """
+    results = {}
+    for thread_count in thread_counts:
+        record_system = ConcurrentPatientRecordSystem(max_patients=n, growable=True)
+        queue = BlockingQueue(maxsize=1000)
+        share = n // thread_count
+        created = [None] * thread_count
+
+        def intake(worker):
+            patients = [Patient("Stress", "2000-1-1", RandomMedicalHistory.ENTRY_1.value, "0500000000", "2024-1-1")
+                        for _ in range(share)]
+            for patient in patients:
+                record_system.add_patient(patient)
+                queue.enqueue(patient)
+            for patient in patients:
+                record_system.binary_search_patient(patient.get_patient_id())
+            created[worker] = patients
+
+        def consume():
+            for _ in range(share):
+                queue.dequeue()
+
+        threads = [threading.Thread(target=intake, args=(worker,)) for worker in range(thread_count)]
+        threads += [threading.Thread(target=consume) for _ in range(thread_count)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        patient_ids = [patient.get_patient_id() for patients in created for patient in patients]
+        consistent = (len(set(patient_ids)) == len(patient_ids) == len(record_system.patient_index_map)
+                      and all(record_system.search_patient(patient.get_patient_id()) is patient
+                              for patients in created for patient in patients)
+                      and queue.is_empty())
+        operations = 5 * len(patient_ids)  # create, add, enqueue, dequeue and look up every patient
+        results[thread_count] = {"ops_per_sec": operations / elapsed, "consistent": consistent}
+        print(f"{thread_count} threads: {operations / elapsed:,.0f} operations/s, "
+              f"{'no duplicate IDs, every patient found' if consistent else 'INCONSISTENT'}")
+    return results
+
+
+def benchmark_dispatcher(n=10000, station_counts=(10, 100, 1000), consult_time=0.01):
+    """
+    Simulate n consultations of consult_time seconds at 10, 100 and 1000 concurrent consult stations,
+    all in one event loop, and report the patients consulted per second and the queue waits.
+    """
+    patients = _make_benchmark_patients(n)
+    results = {}
+    for station_count in station_counts:
+        doctors = [Doctor(f"Dr. Station {station}", "General Practice") for station in range(station_count)]
+        start = time.perf_counter()
+        stats = run_consultations(patients, doctors, maxsize=2 * station_count, consult_time=consult_time)
+        elapsed = time.perf_counter() - start
+        results[station_count] = {"patients_per_sec": stats['patients'] / elapsed,
+                                  "p95_wait": stats['wait']['p95'], "p95_consult": stats['consult']['p95']}
+        print(f"{station_count} stations: {stats['patients'] / elapsed:,.0f} patients/s, "
+              f"p95 wait {stats['wait']['p95'] * 1000:.1f} ms, p95 consult {stats['consult']['p95'] * 1000:.1f} ms")
+    return results
+
+
+def benchmark_sharded_sort(n=1000000, process_counts=None, sort_key=('Admission_date', 'Name')):
+    """
+    Time sorting n patients on sort_key in one PatientRecordSystem, then in a ShardedPatientRecordSystem
+    with one shard per worker process for 1, 2, 4, ... processes up to the number of cores, and report the speedup.
+    """
+    if process_counts is None:
+        cores = os.cpu_count() or 1
+        process_counts = sorted({2 ** power for power in range(cores.bit_length()) if 2 ** power <= cores} | {cores})
+    patients = [patient for batch in patient_batches(n, seed=n) for patient in batch]
+    record_system = PatientRecordSystem(max_patients=n)
+    for patient in patients:
+        record_system.add_patient(patient)
+    start = time.perf_counter()
+    record_system.sort_patient_records(sort_key)
+    single = time.perf_counter() - start
+    print(f"{n} patients, one record system: sorted in {single:.2f} s")
+
+    results = {"single": single}
+    for processes in process_counts:
+        with ShardedPatientRecordSystem(shard_count=processes, processes=processes,
+                                        shard_capacity=n // processes + 1) as sharded:
+            for patient in patients:
+                sharded.add_patient(patient)
+            sharded.sort_patient_records('Patient_id')
+            if processes > 1:
+                sharded._map(_sorted_order, [[]] * processes)  # start the worker processes before timing
+            start = time.perf_counter()
+            sharded.sort_patient_records(sort_key)
+            elapsed = time.perf_counter() - start
+        results[processes] = elapsed
+        print(f"{processes} shards and processes: sorted in {elapsed:.2f} s, speedup {single / elapsed:.2f}x")
+    return results
+
+
+def benchmark_summary_cache(n=10000, requests=100000, max_entries=1000):
+    """
+    Time requests summary renderings for n patients, picked so that most requests go to a few
+    recently seen patients as on a reception screen, without and with a SummaryCache.
+    """
+    patients = _make_benchmark_patients(n)
+    rng = random.Random(n)
+    picks = [patients[min(int(rng.expovariate(1 / 100)), n - 1)] for _ in range(requests)]
+    start = time.perf_counter()
+    for patient in picks:
+        patient.render_summary()
+    uncached = time.perf_counter() - start
+    cache = SummaryCache(max_entries)
+    start = time.perf_counter()
+    for patient in picks:
+        cache.get_text(patient)
+    cached = time.perf_counter() - start
+    cache.close()
+    stats = cache.get_stats()
+    print(f"{requests} summaries: rendered {uncached:.3f} s, cached {cached:.3f} s "
+          f"({uncached / cached:.1f}x, hit rate {stats['hit_rate']:.1%})")
+    return {"uncached": uncached, "cached": cached, "hit_rate": stats['hit_rate']}
+
+
+def benchmark_text_index(n=1000000, queries=1000):
+    """
+    Build a FullTextIndex over n generated patients, a tenth of them with a record, then time queries
+    that match one patient, a few thousand patients and a tenth of all patients.
+    """
+    diagnoses = ["Acute inflammation of the knee joint", "Seasonal influenza", "Fractured left wrist",
+                 "Chronic inflammation of the sinuses", "Mild dehydration", "Sprained ankle"]
+    rng = random.Random(n)
+    record_system = PatientRecordSystem(max_patients=n)
+    numbers = []  # ID numbers of the patients with a record
+    for batch in patient_batches(n, seed=n):
+        for patient in batch:
+            if rng.random() < 0.1:
+                number = patient.get_patient_id()[2:]
+                numbers.append(number)
+                patient.add_record(Record(patient.get_patient_id(), f"{rng.choice(diagnoses)}, case {number}",
+                                          f"Follow-up plan {number}"))
+            record_system.add_patient(patient)
+    start = time.perf_counter()
+    index = record_system.create_text_index()
+    build = time.perf_counter() - start
+    print(f"Indexed {n} patients in {build:.2f} s")
+
+    results = {"build": build}
+    for label, query in (("one patient", f"plan {numbers[len(numbers) // 2]}"), ("one diagnosis", "fractured wrist"),
+                         ("prefix", "inflam* knee"), ("one history", "penicillin")):
+        start = time.perf_counter()
+        for _ in range(queries):
+            found = index.search(query)
+        elapsed = (time.perf_counter() - start) / queries
+        results[label] = elapsed
+        print(f"{label} ({query!r}): {len(found)} patients in {elapsed * 1000:.3f} ms")
+    index.close()
+    return results
+
+
+def benchmark_batch_mutations(n=100000, changes=20000):
+    """
+    Apply a nightly sync of changes inserts (with IDs between the stored ones), changes updates and
+    changes deletes to n indexed patients, row at a time and then with the batch methods.
+    """
+    from contextlib import redirect_stdout
+    patients = [patient for batch in patient_batches(n + changes, seed=n) for patient in batch]
+    rng = random.Random(n)
+    new_ids = set(rng.sample([patient.get_patient_id() for patient in patients], changes))
+    new_patients = [patient for patient in patients if patient.get_patient_id() in new_ids]
+    stored_ids = [patient.get_patient_id() for patient in patients if patient.get_patient_id() not in new_ids]
+    updates = [(patient_id, {'phone': '0500000000', 'admission_date': '2024-6-1'})
+               for patient_id in rng.sample(stored_ids, changes)]
+    deletes = rng.sample(stored_ids, changes)
+
+    def stored_system():
+        system = PatientRecordSystem(max_patients=n + changes)
+        system.add_patients(patient for patient in patients if patient.get_patient_id() not in new_ids)
+        system.create_index('phone')
+        system.create_index('admission_date')
+        return system
+
+    results = {}
+    system = stored_system()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for patient in new_patients:
+            system.add_patient(patient)
+        for patient_id, update in updates:
+            system.update_patient(patient_id, **update)
+        for patient_id in deletes:
+            system.delete_patient(patient_id)
+    results['row_at_a_time'] = time.perf_counter() - start
+    system = stored_system()
+    start = time.perf_counter()
+    system.add_patients(new_patients)
+    system.update_many(updates)
+    system.delete_patients(deletes)
+    results['batch'] = time.perf_counter() - start
+    for path, elapsed in results.items():
+        print(f"{3 * changes} changes to {n} patients, {path.replace('_', ' ')}: {elapsed:.2f} s, "
+              f"{3 * changes / elapsed:,.0f} rows/s")
+    return results
+
+
+def run_benchmarks():
+    """Run every benchmark with its default sizes."""
+    benchmark_ordered_insert()
+    benchmark_sort()
+    benchmark_triage_queue()
+    benchmark_memory()
+    benchmark_recovery()
+    benchmark_archive()
+    benchmark_patient_generator()
+    benchmark_import_time()
+    benchmark_instrumentation()
+    benchmark_concurrency()
+    benchmark_dispatcher()
+    benchmark_sharded_sort()
+    benchmark_summary_cache()
+    benchmark_text_index()
+    benchmark_batch_mutations()
+
+
+# Module-level state, created on first use so that importing the module has no side effects
+# (assign a TriageQueue to consultation_queue to consult critical patients first)
+_lazy_globals = {
+    'patient_records_system': lambda: PatientRecordSystem(max_patients=100, growable=True),
+    'consultation_queue': Queue,
+    'doctors': dict,  # Dictionary to store doctors
+    'prescriptions': lambda: defaultdict(Stack),  # Dictionary to store prescriptions stack for each patient
+    'appointments': lambda: defaultdict(Queue),  # Dictionary to store appointments queue for each patient
+    'instrumentation': Instrumentation,  # operation metrics, collected only once enabled
+}
+
+
+def _lazy_global(name):
+    # Return the module-level object called name, creating it the first time
+    value = globals().get(name)
+    if value is None:
+        value = globals()[name] = _lazy_globals[name]()
+    return value
+
+
+def __getattr__(name):
+    # Called for module attributes that do not exist yet, e.g. Assignment2_Data.consultation_queue
+    if name in _lazy_globals:
+        return _lazy_global(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_patient_records_system():
+    return _lazy_global('patient_records_system')
+
+
+def get_consultation_queue():
+    return _lazy_global('consultation_queue')
+
+
+def get_prescription_stacks():
+    return _lazy_global('prescriptions')
+
+
+def get_appointment_queues():
+    return _lazy_global('appointments')
+
+
+def use_thread_safe_state():
+    """
+    Make the module-level record system and queues safe to share between threads.
+    Must be called before they are first used; returns False (and changes nothing) otherwise.
+    """
+    names = ('patient_records_system', 'consultation_queue', 'appointments')
+    if any(globals().get(name) is not None for name in names):
+        print("The module-level records are already in use, they cannot be made thread-safe.")
+        return False
+    globals()['patient_records_system'] = ConcurrentPatientRecordSystem(max_patients=100, growable=True)
+    globals()['consultation_queue'] = BlockingQueue()
+    globals()['appointments'] = defaultdict(BlockingQueue)
+    return True
+
+
+def get_instrumentation():
+    return _lazy_global('instrumentation')
+
+
+def open_data_directory(directory):
+    """Recover the saved module-level state from directory, then journal every change to it."""
+    journal = PatientRecordJournal(directory)
+    journal.recover(get_patient_records_system(), get_prescription_stacks(), get_appointment_queues())
+    return journal
+
+
+def main():
+    """Run the demo and the interactive menu of the hospital's system."""
+    patient_records_system = get_patient_records_system()
+    consultation_queue = get_consultation_queue()
+
+    # Persist the records when HOSPITAL_DATA_DIR is set: recover the saved state, then journal every change
+    data_directory = os.environ.get("HOSPITAL_DATA_DIR")
+    if data_directory:
+        open_data_directory(data_directory)
+
+    # Collect operation metrics when HOSPITAL_METRICS is set to a file or URL; they are exported on exit
+    # (in the Prometheus text format when it ends in .prom, as JSON otherwise)
+    metrics_destination = os.environ.get("HOSPITAL_METRICS")
+    if metrics_destination:
+        get_instrumentation().enable()
+
+    # Some instances to test the code:
+    # Creating patient objects
+    patient1 = Patient("Hamad Alnuaimi", "2004-02-12", "No significant medical history", "0509997667", "2024-04-01")
+    patient2 = Patient("Rashed Alghafri", "1985-10-20", "Allergic to penicillin", "0509999999", "2024-04-02")
+
+    # Creating doctor objects
+    doctor1 = Doctor("Dr. Smith", "Cardiologist")
+    doctor2 = Doctor("Dr. Johnson", "Orthopedic Surgeon")
+
+    # Creating appointment objects
+    appointment1 = Appointment(patient1, doctor1, "2024-04-05", "10:00", "Regular checkup")
+    appointment2 = Appointment(patient2, doctor2, "2024-04-06", "11:00", "Knee pain evaluation")
+
+    # Creating prescription objects
+    prescription1 = Prescription(patient1.get_patient_id(), doctor1.get_doctor_id(), "Aspirin", "100mg", "2 weeks")
+    prescription2 = Prescription(patient2.get_patient_id(), doctor2.get_doctor_id(), "Ibuprofen", "200mg", "1 week")
+
+    # Creating record objects
+    record1 = Record(patient1.get_patient_id(), "High blood pressure", "Prescribed medication and lifestyle changes")
+    record2 = Record(patient2.get_patient_id(), "Knee inflammation", "Recommended rest and physical therapy")
+
+    # Some functions to test the code:
+    # Add patients to consultation queue
+    consultation_queue.enqueue(patient1)
+    consultation_queue.enqueue(patient2)
+
+    # Consult next patient
+    consult_next_patient()
+
+    # Schedule appointments for patients
+    doctor1.schedule_appointment(appointment1)
+    doctor2.schedule_appointment(appointment2)
+
+    # Add prescriptions to patients
+    patient1.add_prescription(prescription1)
+    patient2.add_prescription(prescription2)
+
+    # Add records to patients
+    patient1.add_record(record1)
+    patient2.add_record(record2)
+
+    # Print patient summary
+    patient1.print_patient_summary()
+    patient2.print_patient_summary()
+
+
+    choice = 'o'
+    # Main menu loop
+    while choice != '0':
+        print("\nWelcome to the Hospital's System...")
+        print("1.   Add a patient")
+        print("2.   Generate random patients")
+        print("3.   Add a doctor")
+        print("4.   Create an appointment for a patient")
+        print("5.   Create a prescription for a patient")
+        print("6.   Record the patient's status")
+        print("7.   Add a patient into the queue")
+        print("8.   Add the prescription into the stack")
+        print("9.   Add the patient's appointment into the queue")
+        print("10.  Consult next patient")
+        print("11.  Run performance benchmarks")
+        print("0.   Exit")
+
+        choice = input("Enter your choice: ")
+
+        if choice == '1':
+            # Add a patient
+            name = input("Enter patient name: ")
+            date_of_birth = input("Enter patient's date of birth (YYYY-MM-DD): ")
+            medical_history = input("Enter patient's medical history: ")
+            phone = input("Enter patient's phone number: ")
+            admission_date = input("Enter admission date (YYYY-MM-DD): ")
+            patient = Patient(name, date_of_birth, medical_history, phone, admission_date)
+            patient_records_system.add_patient(patient)
+            print(f"A patient has been successfully created in the system, the patient id is: {patient.get_patient_id()}")
+
+
+        elif choice == '2':
+            num_patients = int(input("How many patients do you want to generate? "))
+            patient_generator(num_patients, queue=consultation_queue)
+            print(f"{num_patients} patients are waiting in the queue.")
+
+
+
+        elif choice == '3':
+            # Add a doctor
+            name = input("Enter doctor name: ")
+            specialty = input("Enter doctor's specialty: ")
+            doctor = Doctor( name, specialty)
+            Doctor.doctors[doctor.get_doctor_id()] = doctor
+            print(f"A doctor has been successfully created in the system, the doctor id is: {doctor.get_doctor_id()}")
+
+
+        elif choice == '4':
+            patient_id = input("Enter patient ID: ")
+            doctor_id = input("Enter doctor ID: ")
+            date = input("Enter appointment date (YYYY-MM-DD): ")
+            appointment_time = input("Enter appointment time (HH:MM): ")
+            reason = input("Enter appointment reason: ")
+            doctor = Doctor.doctors.get(doctor_id)
+            if doctor is not None and not doctor.is_available(date, appointment_time):
+                # Reject double-booking and suggest the doctor's next free slot
+                free_date, free_time = doctor.next_free_slot(date, appointment_time)
+                print(f"The doctor is already booked at that time, the next free slot is {free_date} at {free_time}.")
+            else:
+                patient = patient_records_system.search_patient(patient_id)
+                appointment = Appointment(patient if patient is not None else patient_id,
+                                          doctor if doctor is not None else doctor_id, date, appointment_time, reason)
+                if doctor is not None:
+                    doctor.schedule_appointment(appointment)
+                enqueue_appointment(patient_id, appointment)
+                print(f"An appointment is successfully created with the ID: {appointment.get_appointment_id()}.")
+
+        elif choice == '5':
+            # Create a prescription for a patient
+            patient_id = input("Enter patient ID: ")
+            doctor_id = input("Enter doctor ID: ")
+            medication = input("Enter medication: ")
+            dosage = input("Enter dosage: ")
+            duration = input("Enter duration: ")
+            prescription = Prescription(patient_id, doctor_id, medication, dosage, duration)
+            push_prescription(patient_id, prescription)
+
+        elif choice == '6':
+            # Record the patient's status
+            patient_id = input("Enter patient ID: ")
+            diagnosis = input("Enter diagnosis: ")
+            treatment_plan = input("Enter treatment plan: ")
+            record = Record(patient_id, diagnosis, treatment_plan)
+            patient_records_system.search_patient(patient_id).add_record(record)
+            print(f"The patient status had been successfully recorded, recording ID: {record.get_record_id()}")
+
+        elif choice == '7':
+            # Add a patient into the queue
+            patient_id = input("Enter patient ID: ")
+            add_patient_to_consultation_queue(patient_id, patient_records_system)
+
+        elif choice == '8':
+            # Add the prescription into the stack
+            patient_id = input("Enter patient ID: ")
+            doctor_id = input("Enter doctor ID: ")
+            medication = input("Enter medication: ")
+            dosage = input("Enter dosage: ")
+            duration = input("Enter duration: ")
+            prescription = Prescription(patient_id, doctor_id, medication, dosage, duration)
+            push_prescription(patient_id, prescription)
+
+        elif choice == '9':
+            # Add the patient's appointment into the queue
+            patient_id = input("Enter patient ID: ")
+            doctor_id = input("Enter doctor ID: ")
+            date = input("Enter appointment date (YYYY-MM-DD): ")
+            appointment_time = input("Enter appointment time: ")
+            reason = input("Enter appointment reason: ")
+            appointment = Appointment(patient_id, doctor_id, date, appointment_time, reason)
+            enqueue_appointment(patient_id, appointment)
+
+        elif choice == '10':
+            # Consult next patient
+            consult_next_patient()
+
+        elif choice == '11':
+            # Measure the efficiency of the data structures
+            run_benchmarks()
+
+        elif choice == '0':
+            # Exit the program
+            if patient_records_system.journal is not None:
+                patient_records_system.journal.close()
+            if metrics_destination:
+                get_instrumentation().export(
+                    metrics_destination, 'prometheus' if metrics_destination.endswith('.prom') else 'json')
+            print("Exiting...")
+            break
+
+        else:
+            print("Invalid choice. Please enter a valid option.")
+
+
+if __name__ == "__main__":
+    main()
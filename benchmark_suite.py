@@ -0,0 +1,271 @@
+"""
+Scaling benchmark suite for the data structures in Assignment2_Data.
+
+Every benchmark is run for each n in the sweep (10^3 to 10^6 by default) and reports the
+operations per second, the p50 and p99 latency of one operation and the peak memory
+(measured with tracemalloc in a second, separate run so it does not slow the timed run).
+The results are written as JSON, and can be compared against a stored baseline:
+
+    python benchmark_suite.py --output results.json
+    python benchmark_suite.py --baseline results.json --threshold 0.2
+
+The exit status is 1 when any benchmark is slower than the baseline by more than the threshold.
+
+benchmark_baseline.json is a reference run at reduced sizes, without the memory runs. Timings depend on
+the machine, so regenerate it on the machine that does the comparison before relying on it:
+
+    python benchmark_suite.py --max-n 10000 --no-memory --output benchmark_baseline.json
+    python benchmark_suite.py --max-n 10000 --no-memory --baseline benchmark_baseline.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import Assignment2_Data as hospital
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+
+
+def _make_patients(n):
+    """Build n patients up front, so only the data structure under test is timed."""
+    return [patient for batch in hospital.patient_batches(n, seed=n) for patient in batch]
+
+
+def _filled_system(patients):
+    system = hospital.PatientRecordSystem(max_patients=len(patients))
+    for patient in patients:
+        system.add_patient(patient)
+    return system
+
+
+# Each benchmark takes n and returns the per-operation latencies in nanoseconds
+def bench_add_patient(n):
+    patients = _make_patients(n)  # in arrival order, as the front desk creates them
+    system = hospital.PatientRecordSystem(max_patients=n)
+    clock, samples = time.perf_counter_ns, []
+    for patient in patients:
+        start = clock()
+        system.add_patient(patient)
+        samples.append(clock() - start)
+    return samples
+
+
+def bench_sort_patient_records(n, repeats=3):
+    system = _filled_system(_make_patients(n))
+    clock, samples = time.perf_counter_ns, []
+    for _ in range(repeats):
+        for sort_key in (('Admission_date', 'Name'), 'Patient_id'):
+            start = clock()
+            system.sort_patient_records(sort_key)
+            samples.append(clock() - start)
+    return samples
+
+
+def bench_binary_search_patient(n):
+    patients = _make_patients(n)
+    system = _filled_system(patients)
+    patient_ids = [patient.get_patient_id() for patient in patients]
+    random.Random(n).shuffle(patient_ids)
+    clock, samples = time.perf_counter_ns, []
+    for patient_id in patient_ids:
+        start = clock()
+        system.binary_search_patient(patient_id)
+        samples.append(clock() - start)
+    return samples
+
+
+def bench_delete_patient(n):
+    patients = _make_patients(n)
+    system = _filled_system(patients)
+    patient_ids = [patient.get_patient_id() for patient in patients]
+    random.Random(n).shuffle(patient_ids)
+    clock, samples = time.perf_counter_ns, []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for patient_id in patient_ids:
+            start = clock()
+            system.delete_patient(patient_id)
+            samples.append(clock() - start)
+    return samples
+
+
+def _batch_samples(n, apply, items, batch_size=10000):
+    # One sample per row, the time of each batch spread over its rows
+    clock, samples = time.perf_counter_ns, []
+    for start in range(0, n, batch_size):
+        batch = items[start:start + batch_size]
+        begin = clock()
+        apply(batch)
+        elapsed = clock() - begin
+        samples.extend([elapsed / len(batch)] * len(batch))
+    return samples
+
+
+def bench_add_patients(n):
+    patients = _make_patients(n)
+    random.Random(n).shuffle(patients)  # nightly syncs bring IDs from all over the range
+    system = hospital.PatientRecordSystem(max_patients=n)
+    return _batch_samples(n, system.add_patients, patients)
+
+
+def bench_delete_patients(n):
+    patients = _make_patients(n)
+    system = _filled_system(patients)
+    patient_ids = [patient.get_patient_id() for patient in patients]
+    random.Random(n).shuffle(patient_ids)
+    return _batch_samples(n, system.delete_patients, patient_ids)
+
+
+def _push_then_pop(n, push, pop):
+    # Time n pushes followed by n pops, one sample per operation
+    items = list(range(n))
+    clock, samples = time.perf_counter_ns, []
+    for item in items:
+        start = clock()
+        push(item)
+        samples.append(clock() - start)
+    for _ in items:
+        start = clock()
+        pop()
+        samples.append(clock() - start)
+    return samples
+
+
+def bench_queue(n):
+    queue = hospital.Queue()
+    return _push_then_pop(n, queue.enqueue, queue.dequeue)
+
+
+def bench_stack(n):
+    stack = hospital.Stack()
+    return _push_then_pop(n, stack.push, stack.pop)
+
+
+def bench_singly_linked_list(n):
+    linked_list = hospital.SinglyLinkedList()
+    return _push_then_pop(n, linked_list.enqueue, linked_list.dequeue)
+
+
+def bench_doubly_linked_list(n):
+    linked_list = hospital.DoublyLinkedList()
+    return _push_then_pop(n, linked_list.append, linked_list.pop)
+
+
+def bench_patient_generator(n, chunk_size=1000):
+    # One sample per generated patient, the batch time spread over its patients
+    clock, samples = time.perf_counter_ns, []
+    batches = hospital.patient_batches(n, seed=n, chunk_size=chunk_size)
+    while True:
+        start = clock()
+        batch = next(batches, None)
+        elapsed = clock() - start
+        if batch is None:
+            break
+        samples.extend([elapsed / len(batch)] * len(batch))
+    return samples
+
+
+BENCHMARKS = {
+    "add_patient": bench_add_patient,
+    "sort_patient_records": bench_sort_patient_records,
+    "binary_search_patient": bench_binary_search_patient,
+    "delete_patient": bench_delete_patient,
+    "add_patients": bench_add_patients,
+    "delete_patients": bench_delete_patients,
+    "queue": bench_queue,
+    "stack": bench_stack,
+    "singly_linked_list": bench_singly_linked_list,
+    "doubly_linked_list": bench_doubly_linked_list,
+    "patient_generator": bench_patient_generator,
+}
+
+
+def _percentile(sorted_samples, fraction):
+    return sorted_samples[min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))]
+
+
+def run_benchmark(name, n, measure_memory=True):
+    """Run one benchmark at size n and return its result as a dictionary."""
+    benchmark = BENCHMARKS[name]
+    samples = benchmark(n)
+    total = sum(samples)
+    samples.sort()
+    result = {
+        "benchmark": name,
+        "n": n,
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / total * 1e9 if total else float("inf"),
+        "p50_us": _percentile(samples, 0.50) / 1000,
+        "p99_us": _percentile(samples, 0.99) / 1000,
+        "peak_memory_bytes": None,
+    }
+    if measure_memory:
+        tracemalloc.start()
+        benchmark(n)
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """Return the results whose ops/sec dropped below the baseline by more than threshold (a fraction)."""
+    previous = {(entry["benchmark"], entry["n"]): entry["ops_per_sec"] for entry in baseline["results"]}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["benchmark"], entry["n"]))
+        if before and entry["ops_per_sec"] < before * (1 - threshold):
+            regressions.append(dict(entry, baseline_ops_per_sec=before,
+                                    change=entry["ops_per_sec"] / before - 1))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="values of n to sweep")
+    parser.add_argument("--max-n", type=int, help="skip the sizes above this n")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", help="write the results as JSON to this file (default: standard output)")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="slowdown in ops/sec, as a fraction, that counts as a regression")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory runs")
+    args = parser.parse_args(argv)
+
+    sizes = [n for n in args.sizes if args.max_n is None or n <= args.max_n]
+    results = []
+    for name in args.only or BENCHMARKS:
+        for n in sizes:
+            result = run_benchmark(name, n, measure_memory=not args.no_memory)
+            results.append(result)
+            memory = "" if result["peak_memory_bytes"] is None else f", peak {result['peak_memory_bytes'] / 1e6:.1f} MB"
+            print(f"{name:<22} n={n:<8} {result['ops_per_sec']:>14,.0f} ops/s  p50 {result['p50_us']:.2f} us  "
+                  f"p99 {result['p99_us']:.2f} us{memory}", file=sys.stderr)
+
+    report = {"python": platform.python_version(), "platform": platform.platform(),
+              "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}
+    exit_status = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare_to_baseline(results, json.load(file), args.threshold)
+        report["regressions"] = regressions
+        for entry in regressions:
+            print(f"REGRESSION {entry['benchmark']} n={entry['n']}: {entry['change']:+.1%} ops/s against the baseline",
+                  file=sys.stderr)
+        exit_status = 1 if regressions else 0
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return exit_status
+
+
+if __name__ == "__main__":
+    sys.exit(main())